@@ -0,0 +1,106 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Coroutine, Dict, Iterator, Optional, Union
+
+import pydantic_core
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart
+
+from history import ConversationHistory
+
+# Seconds to group streamed tokens by before re-rendering
+STREAM_DEBOUNCE = 0.05
+
+
+@dataclass
+class StreamUpdate:
+    """One step of a streamed turn.
+
+    `partial` is the text so far for chat agents, or the dict of output fields filled so far for
+    structured coupon agents. The last update also carries the validated `output` and the
+    finished run in `result`.
+    """
+    partial: Union[str, Dict[str, Any]]
+    output: Any = None
+    result: Any = None
+
+
+def partial_output(response: ModelResponse) -> Union[str, Dict[str, Any]]:
+    """Best-effort view of a response that is still streaming in."""
+    for part in response.parts:
+        if isinstance(part, ToolCallPart) and part.args:
+            if isinstance(part.args, dict):
+                return part.args
+            try:
+                return pydantic_core.from_json(part.args, allow_partial=True)
+            except ValueError:
+                return {}
+    return "".join(part.content for part in response.parts if isinstance(part, TextPart))
+
+
+class AgentService:
+    """Runs agent calls on one long-lived event loop in a background thread.
+
+    The OpenAI client's connection pool is bound to the loop it is first used on, so every
+    agent call in the process goes through this loop instead of a fresh `asyncio.run()`.
+    Callers in different threads (one per Streamlit session) submit coroutines concurrently
+    and block only on their own result.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="agent-service", daemon=True)
+        self._thread.start()
+
+    def submit(self, coro: Coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        return self.submit(coro).result(timeout)
+
+    async def _run_turn(self, agent: Agent, user_prompt: str, history: ConversationHistory, deps: Any) -> Any:
+        result = await agent.run(user_prompt=user_prompt, message_history=history.messages, deps=deps)
+        history.record(result)
+        return result
+
+    def run_turn(self, agent: Agent, user_prompt: str, history: ConversationHistory, deps: Any, timeout: Optional[float] = None) -> Any:
+        """Run one conversation turn and fold the result into `history`."""
+        return self.run(self._run_turn(agent, user_prompt, history, deps), timeout)
+
+    async def _stream_turn(self, agent: Agent, user_prompt: str, history: ConversationHistory, deps: Any, updates: queue.Queue) -> None:
+        try:
+            async with agent.run_stream(user_prompt=user_prompt, message_history=history.messages, deps=deps) as result:
+                async for message, is_last in result.stream_structured(debounce_by=STREAM_DEBOUNCE):
+                    if is_last:
+                        output = await result.validate_structured_output(message)
+                    else:
+                        updates.put(StreamUpdate(partial_output(message)))
+            history.record(result)
+            updates.put(StreamUpdate(partial_output(message), output=output, result=result))
+        except Exception as e:
+            updates.put(e)
+
+    def stream_turn(self, agent: Agent, user_prompt: str, history: ConversationHistory, deps: Any) -> Iterator[StreamUpdate]:
+        """Run one conversation turn, yielding partial output as tokens arrive.
+
+        The final update has `result` set; the turn is folded into `history` before it is yielded.
+        """
+        updates: queue.Queue = queue.Queue()
+        self.submit(self._stream_turn(agent, user_prompt, history, deps, updates))
+        while True:
+            update = updates.get()
+            if isinstance(update, Exception):
+                raise update
+            yield update
+            if update.result is not None:
+                return
+
+    def close(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+agent_service = AgentService()
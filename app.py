@@ -1,6 +1,12 @@
 import streamlit as st
-import asyncio
-from main import Agent, chat_agent, standard_coupon_agent, creative_coupon_agent, Deps, message_history
+from main import Agent, chat_agent, standard_coupon_agent, creative_coupon_agent, Deps, run_standard_coupons_fanout
+from main import load_cached_coupon_run, store_coupon_run
+from coupon_cache import coupon_cache
+from kpi_cache import kpi_cache
+from tools import tool_timings
+from kpi_store import list_outlets
+from history import ConversationHistory
+from agent_service import agent_service
 from pathlib import Path
 import time
 
@@ -14,10 +20,18 @@ st.set_page_config(
 st.title("🍽️ Clink - Restaurant KPI Analysis & Coupon Generator")
 st.markdown("*Data-driven coupon strategies for Indian restaurants*")
 
+def current_deps() -> Deps:
+    """Deps for the outlet selected in the sidebar"""
+    outlet = st.session_state.get("outlet", "All outlets")
+    return Deps(kpi_base_folder="./results", outlet=None if outlet == "All outlets" else outlet)
+
 # Sidebar for quick actions and info
 with st.sidebar:
     st.header("📊 Quick Actions")
 
+    st.selectbox("🏪 Outlet", ["All outlets"] + list_outlets("./results"), key="outlet",
+                 help="Answer from one outlet's KPIs, or from the all-outlet rollup")
+
     if st.button("🔍 Explore KPI Structure", use_container_width=True):
         st.session_state.auto_query = "Show me the complete KPI folder structure"
         st.session_state.selected_agent = "chat"
@@ -57,13 +71,26 @@ with st.sidebar:
     st.divider()
 
     st.header("⚙️ System Info")
-    kpi_path = Path("./results")
+    kpi_path = Path(current_deps().kpi_folder)
     if kpi_path.exists():
         csv_files = list(kpi_path.rglob("*.csv"))
         st.success(f"✅ {len(csv_files)} KPI files detected")
     else:
         st.error("❌ KPI folder not found")
 
+    st.toggle("⚡ Stream responses", value=True, key="stream_responses")
+    st.toggle("🔀 Parallel standard coupons", value=True, key="fanout_standard",
+              help="Design the three standard coupons with one agent each, running at the same time")
+    st.toggle("♻️ Regenerate coupons", value=False, key="regenerate_coupons",
+              help="Ignore saved strategies and run the coupon agents again")
+
+    cache_stats = kpi_cache.stats()
+    st.caption(f"🗄️ KPI cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['entries']} entries)")
+    coupon_stats = coupon_cache.stats()
+    st.caption(f"🎟️ Saved strategies: {coupon_stats['entries']} ({coupon_stats['hits']} reused)")
+    for tool_name, timing in tool_timings.stats().items():
+        st.caption(f"⏱️ {tool_name}: {timing['calls']} calls, avg {timing['total_ms'] / timing['calls']:.0f} ms, max {timing['max_ms']:.0f} ms")
+
 # Initialize session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -74,6 +101,9 @@ if "auto_query" not in st.session_state:
 if "selected_agent" not in st.session_state:
     st.session_state.selected_agent = "chat"
 
+if "history" not in st.session_state:
+    st.session_state.history = ConversationHistory()
+
 # Welcome message
 if not st.session_state.messages:
     welcome_msg = {
@@ -266,34 +296,114 @@ Cost Impact: {message["response_data"].miss_you_coupon_cost_analysis}
             else:
                 st.write(message["content"])
 
-async def get_bot_response(user_input: str):
-    global message_history
+def select_agent() -> Agent:
+    if st.session_state.selected_agent == "standard":
+        return standard_coupon_agent
+    elif st.session_state.selected_agent == "creative":
+        return creative_coupon_agent
+    return chat_agent
+
+def error_bot_response(e: Exception):
+    error_response = type('ErrorResponse', (), {})()
+    error_response.output = f"❌ **Error:** {str(e)}\n\nPlease try again or check your data."
+    return error_response, "error"
+
+def display_partial_response(placeholder, partial):
+    """Render a response that is still streaming in: text for chat, filled-in fields for coupon agents"""
+    if isinstance(partial, str):
+        placeholder.markdown(partial + " ▌")
+        return
+
+    sections = []
+    for field, value in partial.items():
+        if value:
+            sections.append(f"**{field.replace('_', ' ').title()}**\n\n{value}")
+    placeholder.markdown("\n\n".join(sections) + " ▌" if sections else "🤖 Clink is analyzing your data...")
+
+def stream_bot_response(user_input: str):
+    history: ConversationHistory = st.session_state.history
 
     try:
-        with st.spinner("🤖 Clink is analyzing your data..."):
-            
-            active_agent: Agent
-            if st.session_state.selected_agent == "standard":
-                active_agent = standard_coupon_agent
-            elif st.session_state.selected_agent == "creative":
-                active_agent = creative_coupon_agent
-            else:
-                active_agent = chat_agent
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            placeholder.markdown("🤖 Clink is analyzing your data...")
+            for update in agent_service.stream_turn(
+                select_agent(),
+                user_input,
+                history,
+                current_deps()
+            ):
+                if update.result is not None:
+                    placeholder.empty()
+                    return update, st.session_state.selected_agent
+                display_partial_response(placeholder, update.partial)
+
+    except Exception as e:
+        return error_bot_response(e)
 
-            response = await active_agent.run(
-                user_prompt=user_input,
-                message_history=message_history,
-                deps=Deps(kpi_base_folder="./results")
+def fanout_bot_response(user_input: str):
+    history: ConversationHistory = st.session_state.history
+
+    try:
+        with st.spinner("🤖 Clink is designing all three coupons in parallel..."):
+            response = agent_service.run(
+                run_standard_coupons_fanout(user_input, current_deps(), history.messages)
             )
+            history.record(response)
+            return response, "standard"
 
-            message_history = response.all_messages()
+    except Exception as e:
+        return error_bot_response(e)
+
+def coupon_run_kind():
+    """Cache key kind of the selected coupon agent, or None for chat"""
+    if st.session_state.selected_agent == "standard":
+        return "standard-fanout" if st.session_state.fanout_standard else "standard"
+    if st.session_state.selected_agent == "creative":
+        return "creative"
+    return None
+
+def get_bot_response(user_input: str):
+    kind = coupon_run_kind()
+    deps = current_deps()
+
+    if kind and not st.session_state.regenerate_coupons:
+        history: ConversationHistory = st.session_state.history
+        cached = load_cached_coupon_run(kind, user_input, deps, history.messages)
+        if cached is not None:
+            history.record(cached)
+            return cached, st.session_state.selected_agent
+
+    response, agent_type = generate_bot_response(user_input)
+    if kind and agent_type != "error":
+        store_coupon_run(kind, user_input, deps, response.output)
+    return response, agent_type
+
+def generate_bot_response(user_input: str):
+    if st.session_state.selected_agent == "standard" and st.session_state.fanout_standard:
+        return fanout_bot_response(user_input)
+    if st.session_state.stream_responses:
+        return stream_bot_response(user_input)
+
+    history: ConversationHistory = st.session_state.history
+
+    try:
+        with st.spinner("🤖 Clink is analyzing your data..."):
+            
+            active_agent = select_agent()
+
+            # Runs on the shared background loop so concurrent sessions don't block each other
+            response = agent_service.run_turn(
+                active_agent,
+                user_input,
+                history,
+                current_deps()
+            )
             
             return response, st.session_state.selected_agent
 
     except Exception as e:
-        error_response = type('ErrorResponse', (), {})()
-        error_response.output = f"❌ **Error:** {str(e)}\n\nPlease try again or check your data."
-        return error_response, "error"
+        return error_bot_response(e)
 
 # Main chat interface
 col1, col2 = st.columns([3, 1])
@@ -319,6 +429,17 @@ with col2:
             for agent, count in agent_counts.items():
                 st.metric(f"{agent.title()} Agent", count)
 
+        turn_metrics = st.session_state.history.turn_metrics
+        if turn_metrics:
+            st.markdown("### 🧮 Prompt Size")
+            st.metric("Prompt Tokens (last turn)", turn_metrics[-1]["request_tokens"])
+            st.metric("History Kept", f"{turn_metrics[-1]['kept_tokens']} tokens")
+            st.metric("Model Round-trips (last turn)", turn_metrics[-1]["model_requests"])
+            st.line_chart({
+                "Prompt tokens": [m["request_tokens"] for m in turn_metrics],
+                "History tokens": [m["history_tokens"] for m in turn_metrics],
+            })
+
 # Handle auto-query from sidebar
 if st.session_state.auto_query:
     user_input = st.session_state.auto_query
@@ -326,7 +447,7 @@ if st.session_state.auto_query:
 
     st.session_state.messages.append({"role": "user", "content": user_input})
     
-    response, agent_type = asyncio.run(get_bot_response(user_input))
+    response, agent_type = get_bot_response(user_input)
     
     if agent_type == "standard":
         st.session_state.messages.append({
@@ -361,7 +482,7 @@ if user_input:
     with st.chat_message("user"):
         st.write(user_input)
     
-    response, agent_type = asyncio.run(get_bot_response(user_input))
+    response, agent_type = get_bot_response(user_input)
     
     if agent_type == "error":
         st.session_state.messages.append({
@@ -376,5 +497,4 @@ if user_input:
             "agent_type": "chat"
         })
     
-    with st.chat_message("assistant"):
-        st.markdown(response.output if hasattr(response, 'output') else str(response))
\ No newline at end of file
+    st.rerun()
\ No newline at end of file
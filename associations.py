@@ -0,0 +1,157 @@
+"""Association rules ("frequently bought together") from the invoice baskets.
+
+For every pair of items bought together in at least `min_support` of all baskets and in at
+least `min_baskets` baskets, and optionally for triples, stores support, confidence and lift.
+Only partners bought together more often than chance (lift above `MIN_LIFT`) are kept, ranked
+by confidence, then lift, so a partner seen in a handful of baskets cannot outrank a steady one
+on lift alone. Rows are sorted by item and rank, so `AssociationIndex`
+answers "top k partners of an item" by slicing k rows.
+
+    python associations.py [--triples] [--min-support 0.0002] [--min-baskets 20]
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from scipy import sparse
+from typing import Dict, List, Optional, Tuple
+
+from co_occurrence import co_occurrence_counts, incidence_matrix
+from kpi_store import kpi_output_path, write_kpi
+from order_items import load_order_items
+
+PAIRS = "order_analysis/Item_Associations.csv"
+TRIPLES = "order_analysis/Item_Association_Triples.csv"
+
+# Share of all baskets a combination must appear in to be kept
+MIN_SUPPORT = float(os.getenv("ASSOCIATION_MIN_SUPPORT", "0.0002"))
+# and the baskets it must appear in; lift over a few baskets is noise
+MIN_BASKETS = int(os.getenv("ASSOCIATION_MIN_BASKETS", "20"))
+# and how much more often than chance; below 1 the items are bought together less than expected
+MIN_LIFT = float(os.getenv("ASSOCIATION_MIN_LIFT", "1.0"))
+
+
+def rule_table(keys: Dict[str, np.ndarray], partner: np.ndarray, baskets: np.ndarray, antecedent_baskets: np.ndarray,
+               partner_baskets: np.ndarray, n_baskets: int) -> pd.DataFrame:
+    """Support, confidence and lift of `keys` -> `partner` above `MIN_LIFT`, ranked by confidence, then lift, within each key."""
+    table = pd.DataFrame({
+        **keys,
+        "partner": partner,
+        "baskets": baskets,
+        "support": baskets / n_baskets,
+        "confidence": baskets / antecedent_baskets,
+        "lift": baskets * n_baskets / (antecedent_baskets * partner_baskets),
+    })
+    table = table[table["lift"] > MIN_LIFT]
+    table = table.sort_values(list(keys) + ["confidence", "lift"], ascending=[True] * len(keys) + [False, False], ignore_index=True)
+    table.insert(len(keys), "rank", table.groupby(list(keys)).cumcount() + 1)
+    return table
+
+
+def min_count(n_baskets: int, min_support: float, min_baskets: int) -> float:
+    """Baskets a combination must appear in to be kept."""
+    return max(1.0, min_baskets, min_support * n_baskets)
+
+
+def pair_rules(incidence: sparse.csr_matrix, names: pd.Index, min_support: float = MIN_SUPPORT,
+               min_baskets: int = MIN_BASKETS) -> pd.DataFrame:
+    item_baskets = np.asarray(incidence.sum(axis=0)).ravel()
+    return rules_from_counts(co_occurrence_counts(incidence), item_baskets, incidence.shape[0], names, min_support, min_baskets)
+
+
+def rules_from_counts(counts: sparse.spmatrix, item_baskets: np.ndarray, n_baskets: int, names: pd.Index,
+                      min_support: float = MIN_SUPPORT, min_baskets: int = MIN_BASKETS) -> pd.DataFrame:
+    """Pair rules from co-occurrence counts, the baskets of every item and the number of baskets."""
+    counts = counts.tocoo()
+    keep = counts.data >= min_count(n_baskets, min_support, min_baskets)
+    rows, cols, baskets = counts.row[keep], counts.col[keep], counts.data[keep]
+    return rule_table(
+        {"item": names[rows]}, names[cols], baskets, item_baskets[rows], item_baskets[cols], n_baskets,
+    )
+
+
+def triple_rules(incidence: sparse.csr_matrix, names: pd.Index, pairs: pd.DataFrame, min_support: float = MIN_SUPPORT,
+                 min_baskets: int = MIN_BASKETS) -> pd.DataFrame:
+    """Rules {item, with_item} -> partner for every kept pair, from one sparse product.
+
+    Each kept pair becomes a column of a basket x pair matrix (the baskets holding both items);
+    multiplying it by the incidence matrix counts the baskets holding each pair plus a third item.
+    """
+    n_baskets = incidence.shape[0]
+    item_baskets = np.asarray(incidence.sum(axis=0)).ravel()
+    codes = pd.Series(np.arange(len(names)), index=names)
+    unique_pairs = pairs[pairs["item"] < pairs["partner"]]
+    first, second = codes[unique_pairs["item"]].to_numpy(), codes[unique_pairs["partner"]].to_numpy()
+    columns = incidence.tocsc()
+    both = columns[:, first].multiply(columns[:, second]).tocsc()
+    counts = (both.T @ incidence).tocoo()
+
+    keep = (counts.data >= min_count(n_baskets, min_support, min_baskets)) & (counts.col != first[counts.row]) & (counts.col != second[counts.row])
+    pair_idx, partner, baskets = counts.row[keep], counts.col[keep], counts.data[keep]
+    return rule_table(
+        {"item": names[first[pair_idx]], "with_item": names[second[pair_idx]]},
+        names[partner], baskets, unique_pairs["baskets"].to_numpy()[pair_idx], item_baskets[partner], n_baskets,
+    )
+
+
+def build_associations(items: pd.DataFrame, min_support: float = MIN_SUPPORT, triples: bool = False,
+                       min_baskets: int = MIN_BASKETS) -> Dict[str, pd.DataFrame]:
+    incidence, names = incidence_matrix(items)
+    tables = {PAIRS: pair_rules(incidence, names, min_support, min_baskets)}
+    if triples:
+        tables[TRIPLES] = triple_rules(incidence, names, tables[PAIRS], min_support, min_baskets)
+    return tables
+
+
+def write_associations(tables: Dict[str, pd.DataFrame], root: Optional[Path] = None) -> List[Path]:
+    written = []
+    for rel_path, table in tables.items():
+        path = kpi_output_path(rel_path, root)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_kpi(table, path)
+        written.append(path)
+    return written
+
+
+class AssociationIndex:
+    """Top-k lookups over a rule table sorted by key and rank.
+
+    The row range of every key is computed once; a lookup slices at most k rows.
+    """
+
+    def __init__(self, rules: pd.DataFrame):
+        self.rules = rules.reset_index(drop=True)
+        self.key_columns = ["item", "with_item"] if "with_item" in rules.columns else ["item"]
+        self.ranges: Dict[Tuple, Tuple[int, int]] = {}
+        for key, idx in self.rules.groupby(self.key_columns, observed=True, sort=False).indices.items():
+            key = key if isinstance(key, tuple) else (key,)
+            self.ranges[tuple(k.lower() for k in key)] = (int(idx.min()), int(idx.max()) + 1)
+        self.names = {name.lower(): name for name in self.rules["item"].unique()}
+
+    def resolve(self, item: str) -> Optional[str]:
+        """Exact item name for a case-insensitive name or, failing that, a unique substring."""
+        name = self.names.get(item.strip().lower())
+        if name is not None:
+            return name
+        matches = [name for lower, name in self.names.items() if item.strip().lower() in lower]
+        return matches[0] if len(matches) == 1 else None
+
+    def top(self, *key: str, k: int = 5) -> pd.DataFrame:
+        start, stop = self.ranges.get(tuple(part.lower() for part in key), (0, 0))
+        return self.rules.iloc[start:min(stop, start + k)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--triples", action="store_true", help="Also compute {item, with_item} -> partner rules")
+    parser.add_argument("--min-support", type=float, default=MIN_SUPPORT)
+    parser.add_argument("--min-baskets", type=int, default=MIN_BASKETS)
+    args = parser.parse_args()
+    tables = build_associations(load_order_items(), args.min_support, args.triples, args.min_baskets)
+    for path, table in zip(write_associations(tables), tables.values()):
+        print(f"📦 {path} ({len(table)} rules)")
+
+
+if __name__ == "__main__":
+    main()
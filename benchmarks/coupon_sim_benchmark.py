@@ -0,0 +1,47 @@
+"""Scenarios per second of the coupon simulator, by customer base size and process-pool workers.
+
+Larger customer bases are built by repeating the customer KPI table. Each case runs once to
+start the pool's workers, then is timed on a second run.
+
+    python benchmarks/coupon_sim_benchmark.py [--scales 1 10 100] [--workers 1 2 4] [--scenarios 2000]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+
+from coupon_simulator import CouponSpec, load_customer_kpis, simulate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, os.cpu_count() or 1}))
+    parser.add_argument("--scenarios", type=int, default=2000)
+    args = parser.parse_args()
+
+    kpis = load_customer_kpis()
+    spec = CouponSpec(discount_pct=15, min_order=300, stamp_threshold=1, validity_days=30)
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'scale':>6} {'customers':>10} {'workers':>8} {'scenarios':>10} {'seconds':>8} {'scen/s':>9} {'cells/s':>12}")
+    for scale in args.scales:
+        customers = pd.concat([kpis] * scale, ignore_index=True)
+        scenarios = max(100, args.scenarios // scale)
+        for workers in args.workers:
+            simulate(customers, spec, scenarios, workers=workers)
+            start = time.perf_counter()
+            simulate(customers, spec, scenarios, workers=workers)
+            seconds = time.perf_counter() - start
+            print(
+                f"{scale:>5}x {len(customers):>10} {workers:>8} {scenarios:>10} {seconds:>8.2f} "
+                f"{scenarios / seconds:>9.0f} {scenarios * len(customers) / seconds:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
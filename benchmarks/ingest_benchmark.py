@@ -0,0 +1,85 @@
+"""Memory and throughput of the streaming ingest against a one-shot read of the order-item export.
+
+Builds synthetic exports at 1x, 10x and 100x the current file by repeating it with shifted
+invoice numbers, then runs each case in a fresh process so peak RSS is measured per case.
+
+    python benchmarks/ingest_benchmark.py [--scales 1 10 100] [--chunk-rows 100000]
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pandas as pd
+
+from order_items import ORDER_ITEMS_CSV, CHUNK_ROWS, csv_dtypes, item_sales, type_order_items
+from order_stream import stream_product_kpis
+
+
+def build_export(scale: int, target: Path) -> Path:
+    """Write `scale` copies of the export, each with its own invoice number range."""
+    df = pd.read_csv(ORDER_ITEMS_CSV)
+    offset = int(df["invoice_no"].max()) + 1
+    for copy in range(scale):
+        part = df.assign(invoice_no=df["invoice_no"] + copy * offset)
+        part.to_csv(target, mode="a" if copy else "w", header=copy == 0, index=False)
+    return target
+
+
+def one_shot(path: Path) -> int:
+    """The notebooks' approach: load everything, then aggregate."""
+    sales = item_sales(type_order_items(pd.read_csv(path, dtype=csv_dtypes())))
+    sales.groupby("item_name", observed=True).agg(
+        total_units_sold=("item_quantity", "sum"),
+        total_net_sales=("net_sales", "sum"),
+        orders_count=("invoice_no", "nunique"),
+    )
+    return len(sales)
+
+
+def run_case(mode: str, path: Path, chunk_rows: int) -> None:
+    start = time.perf_counter()
+    if mode == "stream":
+        stream_product_kpis(path, chunk_rows)
+    else:
+        one_shot(path)
+    seconds = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{seconds:.3f} {peak_mb:.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--case", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(args.case[0], Path(args.case[1]), args.chunk_rows)
+        return
+
+    base_rows = sum(1 for _ in open(ORDER_ITEMS_CSV, encoding="utf-8")) - 1
+    print(f"{'scale':>6} {'rows':>10} {'size MB':>8} {'mode':>9} {'seconds':>8} {'rows/s':>10} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scales:
+            path = build_export(scale, Path(tmp) / f"orders_x{scale}.csv")
+            rows = base_rows * scale
+            size_mb = path.stat().st_size / 1e6
+            for mode in ("one-shot", "stream"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--case", mode, str(path), "--chunk-rows", str(args.chunk_rows)],
+                    check=True, capture_output=True, text=True,
+                ).stdout.split()
+                seconds, peak_mb = float(out[0]), float(out[1])
+                print(f"{scale:>5}x {rows:>10} {size_mb:>8.0f} {mode:>9} {seconds:>8.2f} {rows / seconds:>10.0f} {peak_mb:>8.0f}")
+            path.unlink()
+
+
+if __name__ == "__main__":
+    main()
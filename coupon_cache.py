@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Type
+
+from pydantic import BaseModel
+
+# Where coupon strategies are kept between app restarts
+COUPON_CACHE_PATH = os.getenv("COUPON_CACHE_PATH", ".cache/coupon_cache.sqlite")
+COUPON_CACHE_TTL = int(os.getenv("COUPON_CACHE_TTL", str(7 * 24 * 3600)))
+COUPON_CACHE_SIZE = int(os.getenv("COUPON_CACHE_SIZE", "200"))
+
+
+def coupon_cache_key(agent_name: str, model_name: str, model_settings: Any, system_prompt: str, user_prompt: str, data_fingerprint: str) -> str:
+    """Key a coupon run on everything that can change its output, including the KPI data version."""
+    payload = json.dumps({
+        "agent": agent_name,
+        "model": model_name,
+        "settings": model_settings,
+        "system_prompt": hashlib.sha1(system_prompt.encode()).hexdigest(),
+        "user_prompt": user_prompt.strip(),
+        "data": data_fingerprint,
+    }, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class CouponCache:
+    """Persistent SQLite cache of structured coupon outputs with TTL and LRU size eviction."""
+
+    def __init__(self, path: str = COUPON_CACHE_PATH, ttl_seconds: int = COUPON_CACHE_TTL, max_entries: int = COUPON_CACHE_SIZE):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS coupons ("
+                "key TEXT PRIMARY KEY, agent TEXT, output TEXT, created_at REAL, last_access REAL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, key: str, output_type: Type[BaseModel]) -> Optional[BaseModel]:
+        now = time.time()
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT output, created_at FROM coupons WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            db.execute("UPDATE coupons SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return output_type.model_validate_json(row[0])
+
+    def put(self, key: str, agent_name: str, output: BaseModel) -> None:
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO coupons (key, agent, output, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, agent_name, output.model_dump_json(), now, now),
+            )
+            db.execute("DELETE FROM coupons WHERE created_at < ?", (now - self.ttl_seconds,))
+            db.execute(
+                "DELETE FROM coupons WHERE key NOT IN (SELECT key FROM coupons ORDER BY last_access DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM coupons")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock, self._connect() as db:
+            entries = db.execute("SELECT COUNT(*) FROM coupons").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses}
+
+
+coupon_cache = CouponCache()
@@ -0,0 +1,220 @@
+"""Monte Carlo estimate of what a coupon costs and what it brings in.
+
+Each scenario draws the uncertain campaign parameters (redemption rate and visit uplift), then
+every targeted customer's baseline visits, response, extra visits and order values within the
+coupon's validity window. Scenarios are simulated as (scenarios x customers) NumPy arrays in
+batches, and blocks of scenarios run in a process pool, each with its own random stream.
+
+Customer behaviour comes from the customer KPI table: the visit rate is Frequency over Tenure,
+order values are drawn around each customer's AOV, and the response falls off with Recency.
+
+    python coupon_simulator.py --discount 15 --min-order 300 --segment Loyal
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from multiprocessing import get_context
+from typing import Dict, Optional, Tuple
+
+from customer_kpis import rfm_segments
+from kpi_store import KPI_ROOTS, locate_kpi_file, read_kpi_table
+
+CUSTOMERS = "customer_analysis/Customer_KPIs_KnownPhonesOnly.csv"
+
+SCENARIOS = 2000
+# Scenario x customer cells simulated per NumPy batch
+BATCH_CELLS = 2_000_000
+SIM_WORKERS = int(os.getenv("COUPON_SIM_WORKERS", str(os.cpu_count() or 1)))
+# Below this many cells in total, a process pool costs more than it saves
+POOL_MIN_CELLS = 5_000_000
+
+SEGMENT_ALL = "all"
+
+
+@dataclass
+class Assumptions:
+    """Behavioural parameters of the simulation; each scenario draws around the means given here."""
+    base_redemption: float = 0.04       # share of targeted customers responding to a 0% coupon
+    redemption_per_pct: float = 0.006   # extra response per discount percentage point
+    redemption_concentration: float = 40.0  # Beta concentration of the scenario redemption rate
+    extra_visits: float = 1.0           # mean extra visits of a responding customer
+    extra_visits_cv: float = 0.3        # scenario-to-scenario variation of the extra visits
+    recency_half_life: float = 90.0     # days of inactivity halving a customer's response
+    order_value_shape: float = 4.0      # Gamma shape of order values around the customer's AOV
+    min_tenure_days: float = 30.0       # floor of the tenure the visit rate is measured over
+
+
+@dataclass
+class CouponSpec:
+    """A coupon to simulate.
+
+    `stamp_threshold` > 1 makes it a stamp card: the discount applies to the order that completes
+    that many visits within the validity window; otherwise the first qualifying order redeems it.
+    `segment` is an RFM segment (e.g. 'Loyal'), a cluster ('cluster 2') or 'all'.
+    """
+    discount_pct: float
+    min_order: float = 0.0
+    stamp_threshold: int = 1
+    validity_days: int = 30
+    segment: str = SEGMENT_ALL
+    assumptions: Assumptions = field(default_factory=Assumptions)
+
+    def key(self) -> Tuple:
+        return tuple(sorted((k, tuple(sorted(v.items())) if isinstance(v, dict) else v) for k, v in asdict(self).items()))
+
+
+@dataclass
+class SimulationResult:
+    """Per-scenario totals over the targeted customers."""
+    spec: CouponSpec
+    customers: int
+    discount_spend: np.ndarray
+    incremental_revenue: np.ndarray
+    redemptions: np.ndarray
+    incremental_visits: np.ndarray
+
+    @property
+    def net_revenue(self) -> np.ndarray:
+        return self.incremental_revenue - self.discount_spend
+
+    def summary(self) -> pd.DataFrame:
+        metrics = {
+            "discount_spend": self.discount_spend,
+            "incremental_revenue": self.incremental_revenue,
+            "net_incremental_revenue": self.net_revenue,
+            "redemptions": self.redemptions,
+            "incremental_visits": self.incremental_visits,
+        }
+        return pd.DataFrame({
+            name: {"mean": values.mean(), "p5": np.percentile(values, 5), "p50": np.median(values), "p95": np.percentile(values, 95)}
+            for name, values in metrics.items()
+        }).T
+
+    def describe(self) -> str:
+        spec = self.spec
+        kind = f"stamp card ({spec.stamp_threshold} visits)" if spec.stamp_threshold > 1 else "single-use coupon"
+        text = (
+            f"🎲 {len(self.discount_spend)} scenarios, {kind}: {spec.discount_pct:g}% off, min order {spec.min_order:g}, "
+            f"valid {spec.validity_days} days, segment '{spec.segment}' ({self.customers} customers)\n\n"
+            f"{self.summary().round(1).to_string()}\n\n"
+            f"P(net incremental revenue > 0): {(self.net_revenue > 0).mean():.0%}"
+        )
+        spent = self.discount_spend > 0
+        if spent.any():
+            text += f"; median net return per unit of discount: {np.median(self.net_revenue[spent] / self.discount_spend[spent]):.2f}"
+        return text
+
+
+# --- Customers ---
+def target_customers(kpis: pd.DataFrame, segment: str = SEGMENT_ALL) -> pd.DataFrame:
+    """KPI rows of the customers a coupon targets."""
+    label = segment.strip().lower()
+    if label == SEGMENT_ALL:
+        return kpis
+    if label.startswith("cluster"):
+        return kpis[kpis["Cluster"] == int(label.removeprefix("cluster").strip())]
+    segments = rfm_segments(kpis)["Segment"].astype(str).str.lower()
+    if label not in set(segments):
+        raise ValueError(f"Unknown segment '{segment}'; use 'all', 'cluster N' or one of {sorted(set(rfm_segments(kpis)['Segment'].astype(str)))}")
+    return kpis[segments.to_numpy() == label]
+
+
+def customer_arrays(kpis: pd.DataFrame, assumptions: Assumptions) -> Dict[str, np.ndarray]:
+    """Per-customer daily visit rate, average order value and response weight."""
+    tenure = np.maximum(kpis["Tenure"].to_numpy(dtype="float64"), assumptions.min_tenure_days)
+    return {
+        "rate": kpis["Frequency"].to_numpy(dtype="float64") / tenure,
+        "aov": kpis["AOV"].to_numpy(dtype="float64"),
+        "response": 0.5 ** (kpis["Recency"].to_numpy(dtype="float64") / assumptions.recency_half_life),
+    }
+
+
+# --- Simulation ---
+def simulate_batch(rng: np.random.Generator, customers: Dict[str, np.ndarray], spec: CouponSpec, n: int) -> np.ndarray:
+    """Totals of `n` scenarios over all customers at once: (discount, revenue, redemptions, visits) x n."""
+    a = spec.assumptions
+    mean_redemption = np.clip(a.base_redemption + a.redemption_per_pct * spec.discount_pct, 1e-6, 1 - 1e-6)
+    redemption = rng.beta(mean_redemption * a.redemption_concentration, (1 - mean_redemption) * a.redemption_concentration, n)
+    uplift = rng.gamma(1 / a.extra_visits_cv ** 2, a.extra_visits * a.extra_visits_cv ** 2, n)
+
+    shape = (n, len(customers["rate"]))
+    scale = customers["aov"] / a.order_value_shape
+    baseline = rng.poisson(customers["rate"] * spec.validity_days, shape)
+    responds = rng.random(shape) < redemption[:, None] * customers["response"]
+    extra = np.where(responds, rng.poisson(np.broadcast_to(uplift[:, None], shape)), 0)
+
+    # The discounted order: the first order (or the one completing the stamp card) of a responder
+    order_value = rng.gamma(a.order_value_shape, np.broadcast_to(scale, shape))
+    redeemed = responds & (baseline + extra >= max(spec.stamp_threshold, 1)) & (order_value >= spec.min_order)
+    discount = np.where(redeemed, order_value * spec.discount_pct / 100, 0.0)
+    if spec.stamp_threshold <= 1:
+        # A single-use coupon only brings in the customers who end up redeeming it
+        extra = np.where(redeemed, extra, 0)
+    # Extra visits are incremental; the sum of k order values is Gamma(k * shape)
+    revenue = rng.gamma(a.order_value_shape * extra, np.broadcast_to(scale, shape))
+    return np.stack([discount.sum(axis=1), revenue.sum(axis=1), redeemed.sum(axis=1), extra.sum(axis=1)])
+
+
+def simulate_block(customers: Dict[str, np.ndarray], spec: CouponSpec, n: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """`n` scenarios in NumPy batches of about BATCH_CELLS cells; runs in a pool worker."""
+    rng = np.random.default_rng(seed)
+    per_batch = max(1, BATCH_CELLS // max(len(customers["rate"]), 1))
+    return np.concatenate(
+        [simulate_batch(rng, customers, spec, min(per_batch, n - start)) for start in range(0, n, per_batch)], axis=1,
+    )
+
+
+_pools: Dict[int, ProcessPoolExecutor] = {}
+
+
+def process_pool(workers: int = SIM_WORKERS) -> ProcessPoolExecutor:
+    """Shared pool per worker count; spawned rather than forked, since callers run inside threaded servers."""
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+    return _pools[workers]
+
+
+def simulate(kpis: pd.DataFrame, spec: CouponSpec, scenarios: int = SCENARIOS, seed: int = 42, workers: Optional[int] = None) -> SimulationResult:
+    """Simulate `scenarios` campaigns over the customers `spec` targets."""
+    targets = target_customers(kpis, spec.segment)
+    customers = customer_arrays(targets, spec.assumptions)
+    workers = SIM_WORKERS if workers is None else workers
+    if workers > 1 and scenarios * len(targets) < POOL_MIN_CELLS:
+        workers = 1
+
+    blocks = np.array_split(np.arange(scenarios), workers)
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+    if workers > 1:
+        pool = process_pool(workers)
+        futures = [pool.submit(simulate_block, customers, spec, len(block), s) for block, s in zip(blocks, seeds) if len(block)]
+        totals = np.concatenate([f.result() for f in futures], axis=1)
+    else:
+        totals = simulate_block(customers, spec, scenarios, seeds[0])
+    return SimulationResult(spec, len(targets), *totals)
+
+
+def load_customer_kpis(kpi_base_folder: str = KPI_ROOTS[0]) -> pd.DataFrame:
+    path = locate_kpi_file(kpi_base_folder, CUSTOMERS)
+    if path is None:
+        raise FileNotFoundError(f"{CUSTOMERS} not found")
+    return read_kpi_table(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--discount", type=float, required=True, help="Discount in percent")
+    parser.add_argument("--min-order", type=float, default=0.0)
+    parser.add_argument("--stamps", type=int, default=1, help="Visits needed before the discount applies")
+    parser.add_argument("--validity-days", type=int, default=30)
+    parser.add_argument("--segment", default=SEGMENT_ALL)
+    parser.add_argument("--scenarios", type=int, default=SCENARIOS)
+    args = parser.parse_args()
+    spec = CouponSpec(args.discount, args.min_order, args.stamps, args.validity_days, args.segment)
+    print(simulate(load_customer_kpis(), spec, args.scenarios).describe())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Customer clusters that can be updated without refitting k-means on the whole customer base.
+
+The fitted scaler and centroids are persisted, so new or changed customers are placed by nearest
+centroid in one vectorised pass. Scheduled refits move the centroids with mini-batch updates
+that keep every centroid's id. A full refit matches its new centroids to the previous ones, so a
+cluster keeps its label across refits as long as it keeps roughly its place.
+
+    python customer_clusters.py --full      # full k-means fit (the notebook's), labels kept stable
+    python customer_clusters.py --refit     # mini-batch refit from the current customer KPIs
+"""
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from pathlib import Path
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans
+from sklearn.preprocessing import StandardScaler
+from typing import Optional
+
+from kpi_store import KPI_ROOTS, locate_kpi_file, write_kpi
+
+CUSTOMERS = "customer_analysis/Customer_KPIs_KnownPhonesOnly.csv"
+
+# KPI columns clustered on: the notebook's Recency, Frequency and Monetary (CLV)
+FEATURES = ["Recency", "Frequency", "CLV"]
+N_CLUSTERS = 4
+
+MODEL_PATH = Path(os.getenv("KPI_STATE_DIR", ".cache/kpi_state")) / "clusters.json"
+
+# A mini-batch refit is due this many days after the last one
+REFIT_DAYS = int(os.getenv("CLUSTER_REFIT_DAYS", "7"))
+BATCH_SIZE = 4096
+
+
+class ClusterModel:
+    """Scaler, centroids (in scaled space) and per-centroid sample counts of a k-means model."""
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray, centroids: np.ndarray, counts: np.ndarray, fitted_at: datetime):
+        self.mean = mean
+        self.scale = scale
+        self.centroids = centroids
+        self.counts = counts
+        self.fitted_at = fitted_at
+
+    def features(self, kpis: pd.DataFrame) -> np.ndarray:
+        return (kpis[FEATURES].to_numpy(dtype="float64") - self.mean) / self.scale
+
+    @staticmethod
+    def nearest(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """Index of the closest centroid for every row, from one (rows x clusters) distance matrix."""
+        distances = (points ** 2).sum(axis=1)[:, None] - 2 * points @ centroids.T + (centroids ** 2).sum(axis=1)[None, :]
+        return distances.argmin(axis=1)
+
+    def assign(self, kpis: pd.DataFrame) -> pd.Series:
+        return pd.Series(self.nearest(self.features(kpis), self.centroids), index=kpis.index, name="Cluster")
+
+    # --- Fitting ---
+    @classmethod
+    def fit(cls, kpis: pd.DataFrame, n_clusters: int = N_CLUSTERS, previous: Optional["ClusterModel"] = None) -> "ClusterModel":
+        """Full fit, as in the customer notebook; with `previous`, its cluster ids are carried over."""
+        scaler = StandardScaler().fit(kpis[FEATURES].to_numpy(dtype="float64"))
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10).fit(scaler.transform(kpis[FEATURES].to_numpy(dtype="float64")))
+        model = cls(scaler.mean_, scaler.scale_, kmeans.cluster_centers_, np.bincount(kmeans.labels_, minlength=n_clusters).astype("float64"), datetime.now())
+        if previous is not None and len(previous.centroids) == n_clusters:
+            model.relabel_like(previous)
+        return model
+
+    @classmethod
+    def from_labels(cls, kpis: pd.DataFrame) -> "ClusterModel":
+        """Model reproducing existing `Cluster` labels: their centroids under a scaler fitted on `kpis`."""
+        labelled = kpis[kpis["Cluster"].notna()]
+        scaler = StandardScaler().fit(labelled[FEATURES].to_numpy(dtype="float64"))
+        points = scaler.transform(labelled[FEATURES].to_numpy(dtype="float64"))
+        labels = labelled["Cluster"].to_numpy(dtype="int64")
+        counts = np.bincount(labels).astype("float64")
+        centroids = np.stack([np.bincount(labels, weights=points[:, j]) for j in range(points.shape[1])], axis=1) / counts[:, None]
+        return cls(scaler.mean_, scaler.scale_, centroids, counts, datetime.now())
+
+    def relabel_like(self, previous: "ClusterModel") -> None:
+        """Reorder the centroids so each takes the id of the closest previous centroid."""
+        old = (previous.centroids * previous.scale + previous.mean - self.mean) / self.scale
+        cost = ((old[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2)
+        _, order = linear_sum_assignment(cost)
+        self.centroids, self.counts = self.centroids[order], self.counts[order]
+
+    def partial_fit(self, kpis: pd.DataFrame, batch_size: int = BATCH_SIZE, seed: int = 42) -> None:
+        """Mini-batch k-means updates over `kpis` in shuffled batches.
+
+        Each centroid moves towards the mean of its batch members with a step of
+        members / (all samples it has seen), so centroids keep their ids and settle as counts grow.
+        The scaler is kept, so assignments stay comparable with earlier ones.
+        """
+        points = self.features(kpis)
+        points = points[np.random.default_rng(seed).permutation(len(points))]
+        k = len(self.centroids)
+        for start in range(0, len(points), batch_size):
+            batch = points[start:start + batch_size]
+            labels = self.nearest(batch, self.centroids)
+            members = np.bincount(labels, minlength=k).astype("float64")
+            sums = np.stack([np.bincount(labels, weights=batch[:, j], minlength=k) for j in range(batch.shape[1])], axis=1)
+            self.counts += members
+            moved = members > 0
+            self.centroids[moved] += (sums[moved] - members[moved, None] * self.centroids[moved]) / self.counts[moved, None]
+        self.fitted_at = datetime.now()
+
+    def refit_due(self, days: int = REFIT_DAYS) -> bool:
+        return datetime.now() - self.fitted_at >= timedelta(days=days)
+
+    # --- Persistence ---
+    def save(self, path: Path = MODEL_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "features": FEATURES,
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "centroids": self.centroids.tolist(),
+            "counts": self.counts.tolist(),
+            "fitted_at": self.fitted_at.isoformat(),
+        }, indent=2))
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path = MODEL_PATH) -> Optional["ClusterModel"]:
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text())
+        if data.get("features") != FEATURES:
+            return None
+        return cls(
+            np.array(data["mean"]), np.array(data["scale"]), np.array(data["centroids"]),
+            np.array(data["counts"]), datetime.fromisoformat(data["fitted_at"]),
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--full", action="store_true", help="Full k-means fit over every customer")
+    mode.add_argument("--refit", action="store_true", help="Mini-batch refit of the persisted centroids")
+    args = parser.parse_args()
+
+    path = locate_kpi_file(KPI_ROOTS[0], CUSTOMERS)
+    if path is None:
+        parser.error(f"{CUSTOMERS} not found; run the customer notebook first")
+    kpis = pd.read_csv(path, float_precision="round_trip")
+    model = ClusterModel.load()
+    if args.full:
+        model = ClusterModel.fit(kpis, previous=model)
+    else:
+        model = model or ClusterModel.from_labels(kpis)
+        model.partial_fit(kpis)
+    kpis["Cluster"] = model.assign(kpis)
+    write_kpi(kpis, path)
+    model.save()
+    print(f"🧭 {path}: {kpis['Cluster'].value_counts().sort_index().to_dict()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Customer KPIs and rule-based RFM segments, vectorised end to end.
+
+All per-customer measures come from one grouped aggregation of the known-customer order lines.
+Recency, frequency and monetary scores are assigned by binary search over the rule thresholds
+(`np.searchsorted`), and the weighted score is mapped to a segment the same way, so no Python
+function runs per customer.
+
+    python customer_kpis.py [--rules rfm_rules.json]
+
+The rules file holds any of the `RFMRules` fields, e.g.
+`{"weights": [0.4, 0.4, 0.2], "segments": [[4.0, "Champions"], [3.0, "Loyal"]]}`.
+"""
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+from kpi_store import kpi_output_path, write_kpi
+from order_items import load_order_items
+
+SEGMENTS = "customer_analysis/Customer_RFM_Segments.csv"
+TOP_ITEMS = "customer_analysis/Customer_Top_Items.csv"
+
+# Items kept per customer in the top-items table
+TOP_ITEMS_PER_CUSTOMER = 5
+
+DEFAULT_NAME = "Valued Customer"
+
+# Per-customer running totals; everything in the KPI table derives from these
+TOTALS = {
+    "CLV": ("total", "sum"),
+    "lines": ("total", "size"),
+    "Frequency": ("invoice_no", "nunique"),
+    "first_order": ("date", "min"),
+    "last_order": ("date", "max"),
+}
+
+
+# --- Customer KPIs ---
+def known_customer_lines(items: pd.DataFrame) -> pd.DataFrame:
+    """Valid sales lines of customers with a phone number, as the customer notebook filters them."""
+    return items[(items["total"] != 0) & items["customer_phone"].notna()]
+
+
+def customer_totals(lines: pd.DataFrame, unique_items: bool = False, by: Sequence[str] = ("customer_phone",)) -> pd.DataFrame:
+    """One grouped aggregation per phone (or per `by`); optionally with the distinct item count."""
+    spec = dict(TOTALS, Unique_Items_Ordered=("item_name", "nunique")) if unique_items else TOTALS
+    totals = lines.groupby(list(by) if len(by) > 1 else by[0]).agg(**spec)
+    totals["first_order"] = totals["first_order"].dt.normalize()
+    return totals
+
+
+def top_names(name_counts: pd.DataFrame) -> pd.Series:
+    """Most frequent name per phone from `customer_phone, customer_name, count` rows; ties go alphabetically."""
+    return (
+        name_counts.sort_values(["customer_phone", "count", "customer_name"], ascending=[True, False, True])
+        .drop_duplicates("customer_phone")
+        .set_index("customer_phone")["customer_name"]
+    )
+
+
+def name_counts(lines: pd.DataFrame, by: Sequence[str] = ("customer_phone",)) -> pd.DataFrame:
+    return lines.groupby([*by, "customer_name"], observed=True).size().rename("count").reset_index()
+
+
+def item_quantities(lines: pd.DataFrame, by: Sequence[str] = ("customer_phone",)) -> pd.DataFrame:
+    """Units bought per phone (or per `by`) and item; the distinct item count and the top items both derive from it."""
+    quantities = lines.groupby([*by, "item_name"], observed=True)["item_quantity"].sum().rename("quantity").reset_index()
+    quantities["item_name"] = quantities["item_name"].astype(str)
+    return quantities
+
+
+def top_items(quantities: pd.DataFrame, n: int = TOP_ITEMS_PER_CUSTOMER) -> pd.DataFrame:
+    """Each customer's `n` most bought items, ranked by units; ties go alphabetically."""
+    ranked = quantities.sort_values(["customer_phone", "quantity", "item_name"], ascending=[True, False, True], ignore_index=True)
+    ranked["rank"] = ranked.groupby("customer_phone").cumcount() + 1
+    return ranked[ranked["rank"] <= n].reset_index(drop=True)
+
+
+def kpi_table(totals: pd.DataFrame, unique_items: pd.Series, names: pd.Series, clusters: Optional[pd.Series] = None) -> pd.DataFrame:
+    """The customer KPI table, with Recency and Tenure measured from the latest order overall."""
+    latest = totals["last_order"].max()
+    kpis = pd.DataFrame({
+        "CLV": totals["CLV"],
+        "AOV": totals["CLV"] / totals["Frequency"],
+        "Avg Spend per Visit": totals["CLV"] / totals["lines"],
+        "Frequency": totals["Frequency"].astype("int64"),
+        "Recency": (latest - totals["last_order"]).dt.days,
+        "Tenure": (latest - totals["first_order"]).dt.days,
+        "Unique_Items_Ordered": unique_items.reindex(totals.index).astype("int64"),
+    })
+    # Cluster labels come from the clustering step; customers new since then have none yet
+    kpis["Cluster"] = clusters.reindex(kpis.index).astype("Int64") if clusters is not None else pd.NA
+    kpis["customer_name"] = names.reindex(kpis.index).fillna(DEFAULT_NAME)
+    return kpis.rename_axis("customer_phone").reset_index()
+
+
+def customer_kpis(items: pd.DataFrame, clusters: Optional[pd.Series] = None) -> pd.DataFrame:
+    """The notebook's `kpi_master` from the raw order items, without its seven merges."""
+    lines = known_customer_lines(items)
+    totals = customer_totals(lines, unique_items=True)
+    return kpi_table(totals, totals["Unique_Items_Ordered"], top_names(name_counts(lines)), clusters)
+
+
+# --- RFM segments ---
+@dataclass
+class RFMRules:
+    """Thresholds, weights and segment cut-offs of the manual RFM scoring.
+
+    Scores run from 1 to 5. `recency_days` are the upper bounds of scores 5, 4, 3 and 2;
+    `frequency` and `monetary` are the lower bounds of scores 2, 3, 4 and 5. `segments` pairs a
+    minimum weighted score with its label; customers below every cut-off get `default_segment`.
+    """
+    recency_days: Tuple[float, ...] = (7, 14, 30, 60)
+    frequency: Tuple[float, ...] = (2, 5, 10, 20)
+    monetary: Tuple[float, ...] = (500, 1000, 5000, 10000)
+    weights: Tuple[float, float, float] = (0.5, 0.3, 0.2)
+    segments: Tuple[Tuple[float, str], ...] = ((4.5, "Champions"), (3.5, "Loyal"), (2.5, "Potential"))
+    default_segment: str = "At Risk"
+
+    @classmethod
+    def from_json(cls, path: Path) -> "RFMRules":
+        config = json.loads(Path(path).read_text())
+        unknown = set(config) - {f.name for f in fields(cls)}
+        if unknown:
+            raise ValueError(f"Unknown RFM rule fields: {', '.join(sorted(unknown))}")
+        return cls(**config)
+
+    @property
+    def segment_labels(self) -> List[str]:
+        """Labels from the lowest to the highest segment."""
+        return [self.default_segment] + [label for _, label in sorted(self.segments)]
+
+
+def default_rules() -> RFMRules:
+    path = os.getenv("RFM_RULES")
+    return RFMRules.from_json(path) if path else RFMRules()
+
+
+def threshold_scores(values: pd.Series, thresholds: Sequence[float], lower_is_better: bool = False) -> np.ndarray:
+    """1 + the number of thresholds reached, in one binary search over the whole column."""
+    edges = np.sort(np.asarray(thresholds, dtype="float64"))
+    values = values.to_numpy(dtype="float64")
+    if lower_is_better:
+        return (len(edges) + 1 - np.searchsorted(edges, values, side="left")).astype("int8")
+    return (1 + np.searchsorted(edges, values, side="right")).astype("int8")
+
+
+def rfm_segments(kpis: pd.DataFrame, rules: Optional[RFMRules] = None) -> pd.DataFrame:
+    """Manual R/F/M scores, their sum and weighted score, and the segment of every customer."""
+    rules = rules or default_rules()
+    scores = pd.DataFrame({
+        "customer_phone": kpis["customer_phone"],
+        "Recency": kpis["Recency"],
+        "Frequency": kpis["Frequency"],
+        "Monetary": kpis["CLV"],
+        "R_score": threshold_scores(kpis["Recency"], rules.recency_days, lower_is_better=True),
+        "F_score": threshold_scores(kpis["Frequency"], rules.frequency),
+        "M_score": threshold_scores(kpis["CLV"], rules.monetary),
+    })
+    scores["RFM_Score"] = scores[["R_score", "F_score", "M_score"]].sum(axis=1).astype("int8")
+    w_r, w_f, w_m = rules.weights
+    scores["RFM_Weighted"] = (w_r * scores["R_score"] + w_f * scores["F_score"] + w_m * scores["M_score"]).round(2)
+
+    cutoffs = sorted(cutoff for cutoff, _ in rules.segments)
+    codes = np.searchsorted(np.asarray(cutoffs, dtype="float64"), scores["RFM_Weighted"].to_numpy(), side="right")
+    scores["Segment"] = pd.Categorical.from_codes(codes, categories=rules.segment_labels, ordered=True)
+    return scores
+
+
+def write_rfm_segments(kpis: pd.DataFrame, rules: Optional[RFMRules] = None, root: Optional[Path] = None) -> Path:
+    path = kpi_output_path(SEGMENTS, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_kpi(rfm_segments(kpis, rules), path)
+    return path
+
+
+def write_top_items(quantities: pd.DataFrame, root: Optional[Path] = None) -> Path:
+    path = kpi_output_path(TOP_ITEMS, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_kpi(top_items(quantities), path)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=Path, help="JSON file overriding the default RFM rules")
+    args = parser.parse_args()
+    rules = RFMRules.from_json(args.rules) if args.rules else default_rules()
+    items = load_order_items()
+    print(f"📦 {write_rfm_segments(customer_kpis(items), rules)}")
+    print(f"📦 {write_top_items(item_quantities(known_customer_lines(items)))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Phone-indexed customer store for point lookups and segment listings.
+
+Every customer's KPIs, RFM segment, top items and last visits are held column-wise in NumPy
+arrays, one row per customer, with a dict from the normalised int64 phone to the row. Top items
+and visits are stored once, sorted by customer, with per-customer offsets into them, so a lookup
+is one dict access plus a few slices. Rows of every segment and cluster are precomputed, so a
+segment listing never scans the table. Records are built only for the customers returned.
+
+    python customer_store.py 3341804938
+    python customer_store.py --segment Loyal --limit 10
+"""
+import argparse
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+from customer_kpis import TOP_ITEMS, rfm_segments
+from kpi_store import KPI_ROOTS, locate_kpi_file, read_kpi_table
+from lapsed_customers import INVOICES
+
+CUSTOMERS = "customer_analysis/Customer_KPIs_KnownPhonesOnly.csv"
+STORE_FILES = [CUSTOMERS, INVOICES, TOP_ITEMS]
+
+# Most recent visits kept per customer
+LAST_VISITS = 5
+SORT_KEYS = {"clv": "clv", "frequency": "frequency", "recency": "recency", "aov": "aov"}
+
+
+def normalize_phone(phone) -> Optional[int]:
+    """int64 phone from '3341804938', 3341804938.0, '+91 33418 04938' and the like; None if there is none."""
+    if phone is None or (isinstance(phone, float) and np.isnan(phone)):
+        return None
+    text = str(phone).strip()
+    if re.fullmatch(r"\d+(\.0*)?", text):
+        text = text.split(".")[0]
+    digits = re.sub(r"\D", "", text)
+    if len(digits) == 12 and digits.startswith("91"):
+        digits = digits[2:]
+    return int(digits) if digits else None
+
+
+def normalize_phones(phones: pd.Series) -> pd.Series:
+    """Column form of `normalize_phone` for phones parsed as numbers."""
+    return pd.to_numeric(phones, errors="coerce").round().astype("Int64")
+
+
+def grouped_offsets(rows: np.ndarray, n_rows: int) -> np.ndarray:
+    """Start offsets of every row's entries in an array sorted by row; row r spans [offsets[r], offsets[r + 1])."""
+    return np.searchsorted(rows, np.arange(n_rows + 1), side="left")
+
+
+class CustomerRecord:
+    """One customer's profile."""
+
+    __slots__ = ("phone", "name", "clv", "aov", "frequency", "recency", "tenure", "unique_items",
+                 "cluster", "segment", "top_items", "last_visits")
+
+    def __init__(self, phone: int, name: str, clv: float, aov: float, frequency: int, recency: int, tenure: int,
+                 unique_items: int, cluster: Optional[int], segment: str,
+                 top_items: List[Tuple[str, int]], last_visits: List[Tuple[str, float, int]]):
+        self.phone = phone
+        self.name = name
+        self.clv = clv
+        self.aov = aov
+        self.frequency = frequency
+        self.recency = recency
+        self.tenure = tenure
+        self.unique_items = unique_items
+        self.cluster = cluster
+        self.segment = segment
+        self.top_items = top_items
+        self.last_visits = last_visits
+
+    def describe(self) -> str:
+        cluster = "unassigned" if self.cluster is None else self.cluster
+        lines = [
+            f"👤 {self.name} ({self.phone}): segment {self.segment}, cluster {cluster}",
+            f"CLV {self.clv:,.0f} over {self.frequency} visits (AOV {self.aov:,.0f}); "
+            f"last visit {self.recency} days ago, customer for {self.tenure} days, {self.unique_items} distinct items",
+        ]
+        if self.top_items:
+            lines.append("Top items: " + ", ".join(f"{item} ({quantity})" for item, quantity in self.top_items))
+        if self.last_visits:
+            lines.append("Last visits: " + ", ".join(f"{day} ₹{value:,.0f} ({units} items)" for day, value, units in self.last_visits))
+        return "\n".join(lines)
+
+    def summary_row(self) -> Dict:
+        return {
+            "customer_phone": self.phone, "customer_name": self.name, "Segment": self.segment, "Cluster": self.cluster,
+            "CLV": self.clv, "Frequency": self.frequency, "Recency": self.recency,
+            "top_item": self.top_items[0][0] if self.top_items else None,
+        }
+
+
+class CustomerStore:
+    """Column arrays of every customer, a phone -> row index and per-segment and per-cluster rows."""
+
+    def __init__(self, kpis: pd.DataFrame, invoices: Optional[pd.DataFrame] = None, top_items: Optional[pd.DataFrame] = None):
+        kpis = kpis.assign(customer_phone=normalize_phones(kpis["customer_phone"]))
+        kpis = kpis[kpis["customer_phone"].notna()].sort_values("customer_phone", ignore_index=True)
+        self.phones = kpis["customer_phone"].to_numpy(dtype="int64")
+        self.rows: Dict[int, int] = dict(zip(self.phones.tolist(), range(len(self.phones))))
+
+        self.names = kpis["customer_name"].astype(str).to_numpy()
+        self.clv = kpis["CLV"].to_numpy(dtype="float64")
+        self.aov = kpis["AOV"].to_numpy(dtype="float64")
+        self.frequency = kpis["Frequency"].to_numpy(dtype="int64")
+        self.recency = kpis["Recency"].to_numpy(dtype="int64")
+        self.tenure = kpis["Tenure"].to_numpy(dtype="int64")
+        self.unique_items = kpis["Unique_Items_Ordered"].to_numpy(dtype="int64")
+        clusters = kpis["Cluster"] if "Cluster" in kpis.columns else pd.Series(pd.NA, index=kpis.index)
+        self.clusters = pd.to_numeric(clusters, errors="coerce").fillna(-1).to_numpy(dtype="int64")
+        segments = rfm_segments(kpis)["Segment"]
+        self.segment_labels = list(segments.cat.categories)
+        self.segment_codes = segments.cat.codes.to_numpy()
+
+        self.segment_rows = {label.lower(): np.flatnonzero(self.segment_codes == code) for code, label in enumerate(self.segment_labels)}
+        self.cluster_rows = {int(c): np.flatnonzero(self.clusters == c) for c in np.unique(self.clusters) if c >= 0}
+
+        self.top_item_names, self.top_item_units, self.top_item_offsets = self.ragged(
+            top_items, ["item_name", "quantity"], ["rank"], [True],
+        )
+        self.visit_days, self.visit_values, self.visit_units, self.visit_offsets = self.ragged(
+            invoices, ["order_date_only", "net_invoice_value", "total_quantity"], ["order_date"], [False], LAST_VISITS,
+        )
+        self.visit_days = pd.to_datetime(pd.Series(self.visit_days, dtype=object)).dt.strftime("%Y-%m-%d").to_numpy()
+
+    def ragged(self, table: Optional[pd.DataFrame], columns: List[str], order: List[str], ascending: List[bool],
+               per_row: Optional[int] = None) -> List[np.ndarray]:
+        """`columns` of `table` sorted by customer row and `order`, at most `per_row` each, plus the row offsets."""
+        if table is None:
+            return [np.array([], dtype=object) for _ in columns] + [np.zeros(len(self.phones) + 1, dtype="int64")]
+        phones = normalize_phones(table["customer_phone"]).fillna(-1).to_numpy(dtype="int64")
+        rows = self.phones.searchsorted(phones)
+        known = self.phones[np.minimum(rows, len(self.phones) - 1)] == phones if len(self.phones) else np.zeros(len(phones), dtype=bool)
+        table = table[known].assign(_row=rows[known])
+        table = table.sort_values(["_row"] + order, ascending=[True] + ascending, ignore_index=True)
+        if per_row is not None:
+            table = table[table.groupby("_row").cumcount() < per_row]
+        offsets = grouped_offsets(table["_row"].to_numpy(), len(self.phones))
+        return [table[column].to_numpy() for column in columns] + [offsets]
+
+    # --- Lookups ---
+    def record(self, row: int) -> CustomerRecord:
+        items = slice(self.top_item_offsets[row], self.top_item_offsets[row + 1])
+        visits = slice(self.visit_offsets[row], self.visit_offsets[row + 1])
+        return CustomerRecord(
+            int(self.phones[row]), str(self.names[row]), float(self.clv[row]), float(self.aov[row]),
+            int(self.frequency[row]), int(self.recency[row]), int(self.tenure[row]), int(self.unique_items[row]),
+            None if self.clusters[row] < 0 else int(self.clusters[row]), self.segment_labels[self.segment_codes[row]],
+            list(zip(self.top_item_names[items].tolist(), [int(q) for q in self.top_item_units[items]])),
+            list(zip(self.visit_days[visits].tolist(), [float(v) for v in self.visit_values[visits]], [int(u) for u in self.visit_units[visits]])),
+        )
+
+    def get(self, phone) -> Optional[CustomerRecord]:
+        row = self.rows.get(normalize_phone(phone))
+        return None if row is None else self.record(row)
+
+    def segment(self, segment: str = "all") -> np.ndarray:
+        """Rows of 'all', 'cluster N' or an RFM segment."""
+        label = segment.strip().lower()
+        if label == "all":
+            return np.arange(len(self.phones))
+        if label.startswith("cluster"):
+            return self.cluster_rows.get(int(label.removeprefix("cluster").strip()), np.array([], dtype="int64"))
+        if label not in self.segment_rows:
+            raise ValueError(f"Unknown segment '{segment}'; use 'all', 'cluster N' or one of {self.segment_labels}")
+        return self.segment_rows[label]
+
+    def list(self, segment: str = "all", limit: int = 20, sort_by: str = "clv") -> Tuple[int, List[CustomerRecord]]:
+        """Size of the segment and its first `limit` customers, highest `sort_by` first (most recent for recency)."""
+        key = SORT_KEYS.get(sort_by.strip().lower())
+        if key is None:
+            raise ValueError(f"Unknown sort key '{sort_by}'; use one of {list(SORT_KEYS)}")
+        rows = self.segment(segment)
+        values = getattr(self, key)[rows]
+        order = np.argsort(values if key == "recency" else -values, kind="stable")[:max(limit, 0)]
+        return len(rows), [self.record(row) for row in rows[order]]
+
+
+def load_customer_store(kpi_base_folder: str = KPI_ROOTS[0]) -> CustomerStore:
+    paths = {rel_path: locate_kpi_file(kpi_base_folder, rel_path) for rel_path in STORE_FILES}
+    if paths[CUSTOMERS] is None:
+        raise FileNotFoundError(f"{CUSTOMERS} not found")
+    visit_columns = ["customer_phone", "order_date", "order_date_only", "net_invoice_value", "total_quantity"]
+    invoices = read_kpi_table(paths[INVOICES], columns=visit_columns) if paths[INVOICES] else None
+    top_items = read_kpi_table(paths[TOP_ITEMS]) if paths[TOP_ITEMS] else None
+    return CustomerStore(read_kpi_table(paths[CUSTOMERS]), invoices, top_items)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("phone", nargs="?")
+    parser.add_argument("--segment", default="all")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--sort-by", default="clv")
+    args = parser.parse_args()
+    store = load_customer_store()
+    if args.phone:
+        record = store.get(args.phone)
+        print(record.describe() if record else f"No customer with phone {args.phone}")
+        return
+    size, records = store.list(args.segment, args.limit, args.sort_by)
+    print(f"{size} customers in '{args.segment}'")
+    print(pd.DataFrame([record.summary_row() for record in records]).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
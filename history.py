@@ -0,0 +1,167 @@
+import os
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List
+
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.usage import Usage
+
+from kpi_render import count_tokens
+
+# Token ceiling for the history sent back to the model on every turn
+HISTORY_TOKEN_LIMIT = int(os.getenv("HISTORY_TOKEN_LIMIT", "12000"))
+# Turns whose tool returns are always kept verbatim
+KEEP_RECENT_TURNS = 2
+# Name pydantic-ai gives the tool that carries a structured output (StandardResponse, CreativeResponse)
+OUTPUT_TOOL_NAME = "final_result"
+# Model name marking a response that holds a structured output produced outside one agent run
+STRUCTURED_OUTPUT_MODEL = "structured-output"
+
+
+def part_tokens(part: Any) -> int:
+    if isinstance(part, ToolCallPart):
+        return count_tokens(part.tool_name + part.args_as_json_str())
+    if isinstance(part, ToolReturnPart):
+        return count_tokens(part.model_response_str())
+    content = getattr(part, "content", "")
+    return count_tokens(content if isinstance(content, str) else str(content))
+
+
+def message_tokens(messages: List[ModelMessage]) -> int:
+    return sum(part_tokens(part) for message in messages for part in message.parts)
+
+
+def split_turns(messages: List[ModelMessage]) -> List[List[ModelMessage]]:
+    """Group messages into turns, each starting at a request that carries a user prompt."""
+    turns: List[List[ModelMessage]] = []
+    for message in messages:
+        starts_turn = isinstance(message, ModelRequest) and any(isinstance(p, UserPromptPart) for p in message.parts)
+        if starts_turn or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def structured_response(output_json: str) -> ModelResponse:
+    """Response carrying a structured output as JSON text (fan-out and cached turns), marked as such."""
+    return ModelResponse(parts=[TextPart(output_json)], model_name=STRUCTURED_OUTPUT_MODEL)
+
+
+def has_structured_output(turn: List[ModelMessage]) -> bool:
+    return any(
+        message.model_name == STRUCTURED_OUTPUT_MODEL
+        or any(isinstance(part, ToolCallPart) and part.tool_name == OUTPUT_TOOL_NAME for part in message.parts)
+        for message in turn if isinstance(message, ModelResponse)
+    )
+
+
+def stub_tool_return(part: ToolReturnPart) -> ToolReturnPart:
+    """Replace a KPI tool return with a one-line note so the call/return pairing stays valid."""
+    lines = [line.strip() for line in part.model_response_str().splitlines() if line.strip()]
+    preview = " | ".join(lines[:2])[:160]
+    return replace(part, content=f"[Earlier {part.tool_name} output removed to save context ({preview}). Call the tool again if needed.]")
+
+
+def summarize_tool_returns(turn: List[ModelMessage]) -> List[ModelMessage]:
+    compacted = []
+    for message in turn:
+        if isinstance(message, ModelRequest):
+            parts = [
+                stub_tool_return(p) if isinstance(p, ToolReturnPart) and p.tool_name != OUTPUT_TOOL_NAME else p
+                for p in message.parts
+            ]
+            message = replace(message, parts=parts)
+        compacted.append(message)
+    return compacted
+
+
+def with_system_prompt(messages: List[ModelMessage], system_parts: List[SystemPromptPart]) -> List[ModelMessage]:
+    """pydantic-ai only sends the system prompt found in the history, so keep it on the first request."""
+    if not messages or not system_parts or not isinstance(messages[0], ModelRequest):
+        return messages
+    rest = [p for p in messages[0].parts if not isinstance(p, SystemPromptPart)]
+    return [replace(messages[0], parts=system_parts + rest)] + messages[1:]
+
+
+def compact(messages: List[ModelMessage], max_tokens: int = HISTORY_TOKEN_LIMIT, keep_recent_turns: int = KEEP_RECENT_TURNS) -> List[ModelMessage]:
+    """Shrink a conversation under `max_tokens`.
+
+    Old KPI tool returns are summarised first. If that is not enough, whole turns are dropped
+    oldest-first, keeping turns that produced a structured coupon output for as long as possible.
+    The latest turn is never dropped.
+    """
+    system_parts = [
+        p for m in messages if isinstance(m, ModelRequest) for p in m.parts if isinstance(p, SystemPromptPart)
+    ]
+    turns = split_turns(messages)
+    turns = [summarize_tool_returns(t) for t in turns[:-keep_recent_turns]] + turns[-keep_recent_turns:]
+
+    def total() -> int:
+        return message_tokens([m for t in turns for m in t])
+
+    for keep_outputs in (True, False):
+        i = 0
+        while total() > max_tokens and i < len(turns) - 1:
+            if keep_outputs and has_structured_output(turns[i]):
+                i += 1
+                continue
+            turns.pop(i)
+
+    return with_system_prompt([m for t in turns for m in t], system_parts)
+
+
+@dataclass
+class RunRecord:
+    """A finished turn that did not come from a single agent run (fan-out, cache hit).
+
+    Quacks like a pydantic-ai run result for `ConversationHistory.record` and the UI.
+    """
+    output: Any
+    messages: List[ModelMessage]
+    run_usage: Usage = field(default_factory=Usage)
+
+    def all_messages(self) -> List[ModelMessage]:
+        return self.messages
+
+    def usage(self) -> Usage:
+        return self.run_usage
+
+
+class ConversationHistory:
+    """Message history for one conversation, compacted after every turn, with per-turn prompt metrics."""
+
+    def __init__(self, max_tokens: int = HISTORY_TOKEN_LIMIT, keep_recent_turns: int = KEEP_RECENT_TURNS):
+        self.max_tokens = max_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.messages: List[ModelMessage] = []
+        self.turn_metrics: List[Dict[str, int]] = []
+
+    def prompt_tokens(self) -> int:
+        return message_tokens(self.messages)
+
+    def record(self, result: Any) -> None:
+        """Take the messages of a finished run and compact them for the next turn."""
+        sent_tokens = self.prompt_tokens()
+        full = result.all_messages()
+        self.messages = compact(full, self.max_tokens, self.keep_recent_turns)
+        usage = result.usage()
+        self.turn_metrics.append({
+            "turn": len(self.turn_metrics) + 1,
+            "history_tokens": sent_tokens,
+            "request_tokens": usage.request_tokens or 0,
+            "model_requests": usage.requests,
+            "uncompacted_tokens": message_tokens(full),
+            "kept_tokens": self.prompt_tokens(),
+        })
+
+    def clear(self) -> None:
+        self.messages = []
+        self.turn_metrics = []
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterable, Tuple
+
+
+def file_fingerprint(path: Path, content_hash: bool = False) -> Tuple:
+    """Identify the current version of a file by mtime and size, or by a hash of its bytes."""
+    stat = Path(path).stat()
+    if content_hash:
+        return (hashlib.sha1(Path(path).read_bytes()).hexdigest(),)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def tree_fingerprint(root: Path) -> Tuple:
+    """Fingerprint a directory tree by the mtimes of its folders.
+
+    A folder's mtime changes whenever an entry is added, removed or renamed in it,
+    so this notices new or deleted KPI files without stat-ing every file.
+    """
+    entries = []
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames.sort()
+        entries.append((dirpath, os.stat(dirpath).st_mtime_ns))
+    return tuple(entries)
+
+
+class KPICache:
+    """Process-wide, size-bounded LRU cache for loaded KPI tables and rendered tool output.
+
+    Every entry is stored with the fingerprint of the data it was built from; a lookup
+    with a different fingerprint counts as a miss and reloads the entry.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, key: Hashable, fingerprint: Tuple, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == fingerprint:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = loader()
+
+        with self._lock:
+            self._entries[key] = (fingerprint, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Shared by every agent in the process (Streamlit app, CLI and main.py)
+kpi_cache = KPICache(max_entries=int(os.getenv("KPI_CACHE_SIZE", "64")))
+
+
+# path -> (mtime/size fingerprint, SHA-1); kept apart from the table cache so hashing never evicts tables
+_content_hashes: Dict[str, Tuple[Tuple, str]] = {}
+_content_hashes_lock = threading.Lock()
+
+
+def content_hash(path: Path) -> str:
+    """SHA-1 of a file's bytes, recomputed only when its mtime or size changes."""
+    path = Path(path)
+    key, fingerprint = str(path.resolve()), file_fingerprint(path)
+    with _content_hashes_lock:
+        entry = _content_hashes.get(key)
+    if entry is not None and entry[0] == fingerprint:
+        return entry[1]
+    sha1 = file_fingerprint(path, content_hash=True)[0]
+    with _content_hashes_lock:
+        _content_hashes[key] = (fingerprint, sha1)
+    return sha1
+
+
+def files_fingerprint(paths: Iterable[Path]) -> str:
+    """Content hash over the given files; changes whenever any of them changes, appears or disappears."""
+    digest = hashlib.sha1()
+    for path in sorted(Path(path) for path in paths):
+        digest.update(path.as_posix().encode())
+        digest.update(content_hash(path).encode() if path.exists() else b"-")
+    return digest.hexdigest()
@@ -0,0 +1,122 @@
+import pandas as pd
+from pathlib import Path
+from typing import List, Optional
+
+from kpi_cache import kpi_cache, file_fingerprint
+from kpi_store import locate_kpi_file, read_kpi_table
+
+# KPI files the digest is built from, relative to a KPI root
+CUSTOMER_KPIS = "customer_analysis/Customer_KPIs_KnownPhonesOnly.csv"
+INVOICES = "order_analysis/Invoice_Aggregation.csv"
+YEARLY_PRODUCTS = "product_analysis/yearly/Yearly_Product_Performance.csv"
+BY_DAY = "product_analysis/daily/Average_Performance_By_DayOfWeek.csv"
+BY_HOUR = "product_analysis/hourly/Average_Performance_By_Hour.csv"
+CO_OCCURRENCE = "order_analysis/Product_Co_occurence_Matrix_filtered.csv"
+DIGEST_FILES = [CUSTOMER_KPIS, INVOICES, YEARLY_PRODUCTS, BY_DAY, BY_HOUR, CO_OCCURRENCE]
+
+TOP_N = 10
+
+
+def customer_section(df: pd.DataFrame) -> str:
+    lines = [
+        "## Customers (known phones)",
+        f"- {len(df)} customers; {100 * (df['Frequency'] > 1).mean():.1f}% visited more than once",
+        f"- Median CLV ₹{df['CLV'].median():.0f}, median AOV ₹{df['AOV'].median():.0f}, "
+        f"median recency {df['Recency'].median():.0f} days (p75 {df['Recency'].quantile(0.75):.0f})",
+    ]
+    if "Cluster" in df.columns:
+        clusters = df.groupby("Cluster").agg(
+            customers=("CLV", "size"), clv=("CLV", "mean"), aov=("AOV", "mean"),
+            frequency=("Frequency", "mean"), recency=("Recency", "mean"),
+        )
+        lines.append("- Clusters (size | mean CLV | AOV | visits | recency days):")
+        for row in clusters.itertuples():
+            lines.append(
+                f"  - {row.Index}: {row.customers} | ₹{row.clv:.0f} | ₹{row.aov:.0f} | {row.frequency:.1f} | {row.recency:.0f}"
+            )
+    return "\n".join(lines)
+
+
+def invoice_section(df: pd.DataFrame) -> str:
+    dates = pd.to_datetime(df["order_date"], errors="coerce")
+    by_day = dates.dt.day_name().value_counts()
+    by_hour = dates.dt.hour.value_counts().sort_values(ascending=False)
+    return "\n".join([
+        "## Orders",
+        f"- {len(df)} invoices from {dates.min():%Y-%m-%d} to {dates.max():%Y-%m-%d}, "
+        f"average net invoice ₹{df['net_invoice_value'].mean():.0f}, {df['total_quantity'].mean():.2f} units per invoice",
+        "- Busiest days: " + ", ".join(f"{day} {count}" for day, count in by_day.head(3).items())
+        + "; quietest: " + ", ".join(f"{day} {count}" for day, count in by_day.tail(2).items()),
+        "- Peak hours: " + ", ".join(f"{hour}:00 ({count})" for hour, count in by_hour.head(4).items()),
+    ])
+
+
+def product_section(df: pd.DataFrame) -> str:
+    top = df.sort_values("total_units_sold", ascending=False).head(TOP_N)
+    lines = [f"## Top {TOP_N} items (units | net sales | avg price)"]
+    for _, row in top.iterrows():
+        lines.append(f"- {row['item_name']}: {row['total_units_sold']:.0f} | ₹{row['total_net_sales']:.0f} | ₹{row['weighted_avg_price']:.0f}")
+    return "\n".join(lines)
+
+
+def timing_section(by_day: Optional[pd.DataFrame], by_hour: Optional[pd.DataFrame]) -> str:
+    lines = ["## Orders by day and hour (distinct invoices)"]
+    if by_day is not None:
+        lines.append("- " + ", ".join(f"{r.DayOfWeek} {r.avg_orders:.0f}" for r in by_day.itertuples()))
+    if by_hour is not None:
+        lines.append("- " + ", ".join(f"{r.Hour}h {r.avg_orders:.0f}" for r in by_hour.itertuples()))
+    return "\n".join(lines)
+
+
+def co_occurrence_section(df: pd.DataFrame) -> str:
+    # The filtered matrix is square and symmetric with rows in column order
+    matrix = df.fillna(0).set_axis(df.columns, axis=0)
+    pairs = matrix.where(pd.DataFrame(
+        [[i < j for j in range(len(matrix))] for i in range(len(matrix))],
+        index=matrix.index, columns=matrix.columns,
+    )).stack().sort_values(ascending=False).head(TOP_N)
+    lines = [f"## Frequently bought together (top {TOP_N} pairs, invoices)"]
+    lines += [f"- {a} + {b}: {count:.0f}" for (a, b), count in pairs.items()]
+    return "\n".join(lines)
+
+
+def build_kpi_digest(kpi_base_folder: str) -> str:
+    """Compact, precomputed overview of the KPI data for the coupon agents' system prompt."""
+    paths = {rel: locate_kpi_file(kpi_base_folder, rel) for rel in DIGEST_FILES}
+
+    def load(rel: str) -> Optional[pd.DataFrame]:
+        return read_kpi_table(paths[rel]) if paths[rel] is not None else None
+
+    sections: List[str] = [
+        "# KPI Digest",
+        "Precomputed from the KPI files. Use these numbers directly; call the KPI tools only to drill down further.",
+    ]
+    customers, invoices, products = load(CUSTOMER_KPIS), load(INVOICES), load(YEARLY_PRODUCTS)
+    by_day, by_hour, co_occurrence = load(BY_DAY), load(BY_HOUR), load(CO_OCCURRENCE)
+    if customers is not None:
+        sections.append(customer_section(customers))
+    if invoices is not None:
+        sections.append(invoice_section(invoices))
+    if products is not None:
+        sections.append(product_section(products))
+    if by_day is not None or by_hour is not None:
+        sections.append(timing_section(by_day, by_hour))
+    if co_occurrence is not None:
+        sections.append(co_occurrence_section(co_occurrence))
+    return "\n\n".join(sections)
+
+
+def kpi_digest(kpi_base_folder: str) -> str:
+    """The digest for the current data version, rebuilt only when one of its source files changes."""
+    fingerprint = tuple(
+        (rel, file_fingerprint(path) if path is not None else None)
+        for rel in DIGEST_FILES
+        for path in [locate_kpi_file(kpi_base_folder, rel)]
+    )
+    key = ("digest", str(Path(kpi_base_folder).resolve()))
+    return kpi_cache.get_or_load(key, fingerprint, lambda: build_kpi_digest(kpi_base_folder))
+
+
+if __name__ == "__main__":
+    digest = kpi_digest("./results")
+    print(digest)
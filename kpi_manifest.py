@@ -0,0 +1,183 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Optional
+
+from kpi_cache import kpi_cache, file_fingerprint
+from kpi_store import KPI_ROOTS, DATE_COLUMNS, read_kpi_table
+
+MANIFEST_NAME = "kpi_manifest.json"
+MANIFEST_VERSION = 1
+
+# Between full checks for added, removed or rewritten CSVs, the manifest is trusted as it is;
+# the watcher and the scripts that write KPI files refresh it themselves
+MANIFEST_CHECK_SECONDS = float(os.getenv("KPI_MANIFEST_CHECK_SECONDS", "60"))
+_last_checked: Dict[str, float] = {}
+_refresh_lock = threading.RLock()
+
+# Period-like columns that are stored as strings ("2024-04", "2024-04-01")
+PERIOD_COLUMNS = DATE_COLUMNS | {"YearMonth"}
+
+
+def manifest_path(root) -> Path:
+    return Path(root) / MANIFEST_NAME
+
+
+def describe_file(root: Path, csv_path: Path) -> Dict:
+    """Build the manifest entry for one KPI CSV."""
+    rel = csv_path.relative_to(root)
+    parts = rel.parts
+    stat = csv_path.stat()
+    df = read_kpi_table(csv_path)
+
+    date_range = None
+    for col in df.columns:
+        if col in PERIOD_COLUMNS:
+            values = pd.to_datetime(df[col].astype(str), errors="coerce").dropna()
+            if not values.empty:
+                date_range = {"column": col, "min": str(values.min().date()), "max": str(values.max().date())}
+                break
+
+    return {
+        "path": rel.as_posix(),
+        "category": parts[0] if len(parts) > 1 else "",
+        "subcategory": "/".join(parts[1:-1]) or None,
+        "filename": csv_path.name,
+        "rows": int(df.shape[0]),
+        "columns": [str(c) for c in df.columns],
+        "dtypes": {str(c): str(t) for c, t in df.dtypes.items()},
+        "size_bytes": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha1": file_fingerprint(csv_path, content_hash=True)[0],
+        "date_range": date_range,
+        "head": df.head().to_string(),
+        "describe": df.describe().to_string(),
+    }
+
+
+def is_entry_current(entry: Dict, csv_path: Path) -> bool:
+    try:
+        stat = csv_path.stat()
+    except FileNotFoundError:
+        return False
+    return entry["mtime_ns"] == stat.st_mtime_ns and entry["size_bytes"] == stat.st_size
+
+
+def build_manifest(root, previous: Optional[Dict] = None) -> Dict:
+    """Describe every KPI CSV under `root`, reusing entries of `previous` whose file is unchanged."""
+    root = Path(root)
+    old_files = (previous or {}).get("files", {})
+    files = {}
+    for csv_path in sorted(root.rglob("*.csv")):
+        rel = csv_path.relative_to(root).as_posix()
+        old = old_files.get(rel)
+        files[rel] = old if old and is_entry_current(old, csv_path) else describe_file(root, csv_path)
+    return {"version": MANIFEST_VERSION, "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "files": files}
+
+
+def write_manifest(root, manifest: Dict) -> Path:
+    path = manifest_path(root)
+    # A temp file per writer, so concurrent writers never rename each other's half-written file
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, prefix=path.stem, suffix=".tmp", delete=False) as tmp:
+        tmp.write(json.dumps(manifest, indent=2))
+    Path(tmp.name).replace(path)
+    return path
+
+
+def refresh_manifest(root) -> Dict:
+    """Bring the manifest under `root` up to date, re-describing only changed files."""
+    with _refresh_lock:
+        manifest = build_manifest(root, previous=load_manifest(root))
+        write_manifest(root, manifest)
+    return manifest
+
+
+def load_manifest(root) -> Optional[Dict]:
+    path = manifest_path(root)
+    if not path.exists():
+        return None
+
+    def load() -> Optional[Dict]:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+    return kpi_cache.get_or_load(("manifest", str(path.resolve())), file_fingerprint(path), load)
+
+
+def is_manifest_current(root, manifest: Dict) -> bool:
+    """True if the manifest lists exactly the KPI CSVs under `root`, each unchanged since it was described."""
+    root = Path(root)
+    files = {path.relative_to(root).as_posix(): path for path in root.rglob("*.csv")}
+    if files.keys() != manifest["files"].keys():
+        return False
+    return all(is_entry_current(manifest["files"][rel], path) for rel, path in files.items())
+
+
+def current_manifest(root) -> Optional[Dict]:
+    """The manifest under `root`, rebuilt first if KPI files were added, removed or rewritten since.
+
+    The files are checked at most every `MANIFEST_CHECK_SECONDS` per root; other calls only load the manifest.
+    """
+    manifest = load_manifest(root)
+    key = str(Path(root).resolve())
+    if manifest is None or time.monotonic() - _last_checked.get(key, float("-inf")) < MANIFEST_CHECK_SECONDS:
+        return manifest
+    with _refresh_lock:
+        if time.monotonic() - _last_checked.get(key, float("-inf")) < MANIFEST_CHECK_SECONDS:
+            return load_manifest(root)
+        if not is_manifest_current(root, manifest):
+            manifest = refresh_manifest(root)
+        _last_checked[key] = time.monotonic()
+    return manifest
+
+
+def find_entry(root, rel_path: str) -> Optional[Dict]:
+    manifest = load_manifest(root)
+    if manifest is None:
+        return None
+    return manifest["files"].get(rel_path)
+
+
+def watch(roots) -> None:
+    """Keep the manifests of `roots` current while KPI CSVs are rewritten."""
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+    except ImportError:
+        print("watchdog is not installed; run `pip install watchdog` to watch KPI folders")
+        return
+
+    class ManifestHandler(FileSystemEventHandler):
+        def __init__(self, root: str):
+            self.root = root
+
+        def on_any_event(self, event):
+            paths = [getattr(event, "src_path", ""), getattr(event, "dest_path", "")]
+            if any(str(p).endswith(".csv") for p in paths):
+                refresh_manifest(self.root)
+                print(f"🔄 Manifest updated: {manifest_path(self.root)}")
+
+    observer = Observer()
+    for root in roots:
+        observer.schedule(ManifestHandler(root), root, recursive=True)
+    observer.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        observer.stop()
+    observer.join()
+
+
+if __name__ == "__main__":
+    roots = [root for root in KPI_ROOTS if Path(root).exists()]
+    for root in roots:
+        manifest = refresh_manifest(root)
+        print(f"🗂️ {manifest_path(root)}: {len(manifest['files'])} files")
+    if "--watch" in sys.argv:
+        watch(roots)
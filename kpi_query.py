@@ -0,0 +1,185 @@
+import re
+import pandas as pd
+from dataclasses import dataclass
+from typing import List, Optional
+
+from kpi_store import ID_COLUMNS
+
+# Column names the KPI tables use for the dimensions agents filter on
+DATE_CANDIDATES = ["Order_Date", "order_date_only", "order_date", "date"]
+TIMESTAMP_CANDIDATES = ["order_date", "date"]
+ITEM_CANDIDATES = ["item_name"]
+DAY_CANDIDATES = ["DayOfWeek", "order_day"]
+HOUR_CANDIDATES = ["Hour"]
+CLUSTER_CANDIDATES = ["Cluster"]
+
+AGGREGATES = {"sum", "mean", "count", "min", "max", "median"}
+
+# Averages and ratios are not additive: summing or averaging them over a group is meaningless.
+# These are recomputed from their summed parts after grouping; other ratios are dropped.
+RATIOS = {
+    "weighted_avg_price": ("total_net_sales", "total_units_sold"),
+    "average_selling_price": ("total_net_sales", "total_units_sold"),
+    "AOV": ("CLV", "Frequency"),
+}
+RATIO_PATTERN = re.compile(r"avg|average|aov|per visit|ratio|weighted|price|support|confidence|lift", re.IGNORECASE)
+# Per-customer levels (days, scores) can be averaged over a group but not summed
+LEVEL_PATTERN = re.compile(r"recency|tenure|gap|days_since|score", re.IGNORECASE)
+# Identifiers and labels that only look numeric
+LABEL_COLUMNS = ID_COLUMNS | {"Cluster", "rank", "batch", "Hour"}
+
+
+@dataclass
+class KPIQuery:
+    columns: Optional[List[str]] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    items: Optional[List[str]] = None
+    days_of_week: Optional[List[str]] = None
+    hour_from: Optional[int] = None
+    hour_to: Optional[int] = None
+    clusters: Optional[List[int]] = None
+    group_by: Optional[List[str]] = None
+    aggregate: str = "sum"
+    sort_by: Optional[str] = None
+    descending: bool = True
+    limit: int = 20
+
+
+def find_column(names: List[str], candidates: List[str]) -> Optional[str]:
+    return next((c for c in candidates if c in names), None)
+
+
+def required_columns(query: KPIQuery, names: List[str]) -> List[str]:
+    """Columns to read from disk: the projection, the group keys and whatever the filters touch."""
+    wanted = list(query.columns or names)
+    wanted += query.group_by or []
+    date_col = find_column(names, DATE_CANDIDATES)
+    if query.date_from or query.date_to:
+        wanted.append(date_col)
+    if query.items:
+        wanted.append(find_column(names, ITEM_CANDIDATES))
+    if query.days_of_week or "DayOfWeek" in (query.group_by or []):
+        wanted.append(find_column(names, DAY_CANDIDATES) or date_col)
+    if query.hour_from is not None or query.hour_to is not None or "Hour" in (query.group_by or []):
+        wanted.append(find_column(names, HOUR_CANDIDATES) or find_column(names, TIMESTAMP_CANDIDATES))
+    if query.clusters:
+        wanted.append(find_column(names, CLUSTER_CANDIDATES))
+    if query.sort_by:
+        wanted.append(query.sort_by)
+    if query.group_by:
+        wanted += [part for column in list(wanted) for part in RATIOS.get(column, ())]
+    wanted = [c for c in wanted if c in names]
+    return list(dict.fromkeys(wanted))
+
+
+def validate(query: KPIQuery, names: List[str]) -> Optional[str]:
+    """Return an error message for filters or columns this table cannot serve."""
+    unknown = [c for c in (query.columns or []) + (query.group_by or []) if c not in names and c not in ("DayOfWeek", "Hour")]
+    if unknown:
+        return f"Unknown columns: {', '.join(unknown)}. Available: {', '.join(names)}"
+    if query.aggregate not in AGGREGATES:
+        return f"Unknown aggregate '{query.aggregate}'. Use one of: {', '.join(sorted(AGGREGATES))}"
+    date_col = find_column(names, DATE_CANDIDATES)
+    checks = [
+        (query.date_from or query.date_to, date_col, "date"),
+        (query.items, find_column(names, ITEM_CANDIDATES), "item"),
+        (query.days_of_week, find_column(names, DAY_CANDIDATES) or date_col, "day-of-week"),
+        (query.hour_from is not None or query.hour_to is not None,
+         find_column(names, HOUR_CANDIDATES) or find_column(names, TIMESTAMP_CANDIDATES), "hour"),
+        (query.clusters, find_column(names, CLUSTER_CANDIDATES), "cluster"),
+    ]
+    for requested, column, label in checks:
+        if requested and column is None:
+            return f"This table has no {label} column to filter on. Available: {', '.join(names)}"
+    return None
+
+
+def aggregate_groups(df: pd.DataFrame, query: KPIQuery) -> pd.DataFrame:
+    """Aggregate every numeric measure per group; averages and ratios are recomputed from summed parts or dropped."""
+    grouped = df.groupby(query.group_by, observed=True)
+    if query.aggregate == "count":
+        return grouped.size().reset_index(name="count")
+
+    metrics = [c for c in df.columns if c not in query.group_by and c not in LABEL_COLUMNS and pd.api.types.is_numeric_dtype(df[c])]
+    if query.aggregate in ("sum", "mean"):
+        ratios = [c for c in metrics if RATIO_PATTERN.search(c)]
+        metrics = [c for c in metrics if c not in ratios and not (query.aggregate == "sum" and LEVEL_PATTERN.search(c))]
+        result = grouped[metrics].agg(query.aggregate)
+        sums = grouped[metrics].sum()
+        for column in ratios:
+            numerator, denominator = RATIOS.get(column, (None, None))
+            if numerator in sums.columns and denominator in sums.columns:
+                result[column] = sums[numerator] / sums[denominator].where(sums[denominator] != 0)
+    else:
+        result = grouped[metrics].agg(query.aggregate)
+
+    result = result.reset_index()
+    if query.columns:
+        # Parts read only to recompute a ratio are not shown
+        result = result[[c for c in result.columns if c in query.group_by or c in query.columns]]
+    return result
+
+
+def run_query(df: pd.DataFrame, query: KPIQuery) -> pd.DataFrame:
+    """Apply filters, projection, grouping and sorting to a KPI table; the caller applies the row limit."""
+    names = df.columns.tolist()
+    mask = pd.Series(True, index=df.index)
+    date_col = find_column(names, DATE_CANDIDATES)
+    dates = pd.to_datetime(df[date_col], errors="coerce") if date_col else None
+
+    if query.date_from:
+        mask &= dates >= pd.Timestamp(query.date_from)
+    if query.date_to:
+        # date_to is inclusive of the whole day
+        mask &= dates < pd.Timestamp(query.date_to) + pd.Timedelta(days=1)
+
+    if query.items:
+        item_col = find_column(names, ITEM_CANDIDATES)
+        wanted = {i.lower() for i in query.items}
+        mask &= df[item_col].astype(str).str.lower().isin(wanted)
+
+    day_col = find_column(names, DAY_CANDIDATES)
+    day_values = df[day_col].astype(str) if day_col else (dates.dt.day_name() if dates is not None else None)
+    if query.days_of_week:
+        wanted = {d.lower() for d in query.days_of_week}
+        mask &= day_values.str.lower().isin(wanted)
+
+    hour_col = find_column(names, HOUR_CANDIDATES)
+    timestamp_col = find_column(names, TIMESTAMP_CANDIDATES)
+    hour_values = df[hour_col] if hour_col else (
+        pd.to_datetime(df[timestamp_col], errors="coerce").dt.hour if timestamp_col else None
+    )
+    if query.hour_from is not None:
+        mask &= hour_values >= query.hour_from
+    if query.hour_to is not None:
+        mask &= hour_values <= query.hour_to
+
+    if query.clusters:
+        mask &= df[find_column(names, CLUSTER_CANDIDATES)].isin(query.clusters)
+
+    result = df[mask]
+
+    # Allow grouping by weekday / hour even when the table only stores a timestamp
+    if query.group_by:
+        if "DayOfWeek" in query.group_by and "DayOfWeek" not in names and day_values is not None:
+            result = result.assign(DayOfWeek=day_values[mask])
+        if "Hour" in query.group_by and "Hour" not in names and hour_values is not None:
+            result = result.assign(Hour=hour_values[mask])
+
+    if query.columns:
+        keep = list(dict.fromkeys((query.group_by or []) + query.columns))
+        if query.group_by:
+            keep += [part for column in query.columns for part in RATIOS.get(column, ())]
+        result = result[[c for c in dict.fromkeys(keep) if c in result.columns]]
+
+    if query.group_by:
+        result = aggregate_groups(result, query)
+
+    sort_by = query.sort_by
+    if sort_by is None and query.group_by:
+        sort_by = next((c for c in result.columns if c not in query.group_by), None)
+    if sort_by and sort_by in result.columns:
+        result = result.sort_values(sort_by, ascending=not query.descending)
+
+    return result
@@ -0,0 +1,283 @@
+"""Nightly, incremental refresh of the KPI outputs from one day's order items.
+
+A persisted state holds the product base table and the customer running aggregates partitioned
+by order date. Every order date in the new rows replaces that date's partition, in the state and
+in the invoice table, so applying the same day twice, or a corrected export of it, gives the same
+outputs as applying it once. The product tables, customer KPIs, RFM segments and top items are
+then rolled up from the state; the full-year export is never re-read.
+
+Only the all-outlet outputs are refreshed. The per-outlet partitions under `results/outlets/`
+are rebuilt in full by rerunning `outlet_pipeline.py`.
+
+    python kpi_refresh.py --rebuild            # once: build the customer state from the full export
+    python kpi_refresh.py "New Day Items.csv"  # every night
+"""
+import argparse
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from pathlib import Path
+from typing import List, Optional
+
+from customer_clusters import MODEL_PATH, ClusterModel
+from customer_kpis import (customer_totals, item_quantities, kpi_table, known_customer_lines, name_counts, top_names,
+                           write_rfm_segments, write_top_items)
+from kpi_manifest import manifest_path, refresh_manifest
+from kpi_store import KPI_ROOTS, kpi_output_path, list_outlets, write_kpi
+from lapsed_customers import write_targets
+from order_items import load_order_items, parse_order_items
+from product_kpis import ORDER_KEYS, base_table, product_tables, write_product_kpis
+
+# Outputs kept up to date, relative to a KPI root
+INVOICES = "order_analysis/Invoice_Aggregation.csv"
+CUSTOMERS = "customer_analysis/Customer_KPIs_KnownPhonesOnly.csv"
+
+# Product base table and per-customer aggregates between refreshes, partitioned by order date
+STATE_DIR = Path(os.getenv("KPI_STATE_DIR", ".cache/kpi_state"))
+PRODUCTS_STATE = "products"
+# Partition column of every state table
+DAY = "Order_Date"
+
+
+def batch_days(items: pd.DataFrame) -> pd.DatetimeIndex:
+    """The order dates (date partitions) that a batch of order items replaces."""
+    return pd.DatetimeIndex(items["date"].dropna().dt.normalize().unique())
+
+
+def write_state_table(table: pd.DataFrame, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    feather.write_feather(pa.Table.from_pandas(table, preserve_index=False), tmp, compression="uncompressed")
+    tmp.replace(path)
+
+
+# --- Product and invoice partitions ---
+def load_product_base(state_dir: Path = STATE_DIR) -> Optional[pd.DataFrame]:
+    path = state_dir / f"{PRODUCTS_STATE}.arrow"
+    if not path.exists():
+        return None
+    base = feather.read_table(path).to_pandas()
+    # Saved before the base was keyed by outlet; needs a rebuild
+    return base if set(ORDER_KEYS) <= set(base.columns) else None
+
+
+def update_product_base(base: pd.DataFrame, items: pd.DataFrame) -> pd.DataFrame:
+    """The product base table with the date partitions of `items` replaced by theirs."""
+    kept = base[~base[DAY].isin(batch_days(items))]
+    return pd.concat([kept, base_table(items)], ignore_index=True).sort_values([DAY, "Hour"], kind="stable", ignore_index=True)
+
+
+def invoice_partition(items: pd.DataFrame) -> pd.DataFrame:
+    """Invoice-level KPIs of `items`, as built by the order notebook."""
+    lines = items.dropna(subset=["invoice_no", "item_name", "item_quantity", "item_total"]).copy()
+    lines["net_sales"] = lines["item_total"] - lines[["discount", "waived_off"]].sum(axis=1)
+    invoices = lines.groupby(ORDER_KEYS, observed=True, dropna=False).agg(
+        order_date=("date", "min"),
+        customer_phone=("customer_phone", "first"),
+        customer_name=("customer_name", "first"),
+        total_items=("item_name", "nunique"),
+        total_quantity=("item_quantity", "sum"),
+        total_discount=("discount", "sum"),
+        total_waived_off=("waived_off", "sum"),
+        net_invoice_value=("net_sales", "sum"),
+    ).reset_index()
+    invoices["order_day"] = invoices["order_date"].dt.day_name()
+    invoices["order_date_only"] = invoices["order_date"].dt.strftime("%Y-%m-%d")
+    invoices["order_date"] = invoices["order_date"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    return invoices
+
+
+def replace_partitions(existing: pd.DataFrame, new: pd.DataFrame, date_column: str, sort_by: Optional[List[str]] = None,
+                       days: Optional[pd.Index] = None) -> pd.DataFrame:
+    """Swap the rows of every date in `days` (default: present in `new`); other dates are kept as they are."""
+    days = new[date_column].unique() if days is None else days
+    kept = existing[~existing[date_column].astype(str).isin(days)]
+    combined = pd.concat([kept, new], ignore_index=True)
+    if sort_by:
+        combined = combined.sort_values(sort_by, kind="stable", ignore_index=True)
+    return combined
+
+
+# --- Customer running aggregates ---
+class CustomerState:
+    """Per-customer running totals from which the customer KPI table is derived.
+
+    `customers` holds one row per phone and order date (CLV, line count, visit count, first and
+    last order); `items` and `names` hold the units per phone, date and item and the name counts per
+    phone and date that the unique item count, the top items and the most frequent name need.
+    Keeping the order date in every table lets a batch replace the dates it covers.
+    """
+
+    FILES = ("customers", "items", "names")
+    KEYS = {
+        "customers": ["customer_phone", DAY],
+        "items": ["customer_phone", DAY, "item_name"],
+        "names": ["customer_phone", DAY, "customer_name"],
+    }
+    TOTALS = {"CLV": "sum", "lines": "sum", "Frequency": "sum", "first_order": "min", "last_order": "max"}
+
+    def __init__(self, customers: pd.DataFrame, items: pd.DataFrame, names: pd.DataFrame):
+        self.customers = customers
+        self.items = items
+        self.names = names
+
+    @classmethod
+    def from_items(cls, items: pd.DataFrame) -> "CustomerState":
+        lines = known_customer_lines(items)
+        lines = lines.assign(**{DAY: lines["date"].dt.normalize()})
+        keys = cls.KEYS["customers"]
+        return cls(customer_totals(lines, by=keys).reset_index(), item_quantities(lines, by=keys), name_counts(lines, by=keys))
+
+    @classmethod
+    def combine(cls, states: List["CustomerState"]) -> "CustomerState":
+        """One state from several, e.g. per-outlet states into the all-outlet one; invoices are distinct per state."""
+        customers = pd.concat([state.customers for state in states], ignore_index=True)
+        items = pd.concat([state.items for state in states], ignore_index=True)
+        names = pd.concat([state.names for state in states], ignore_index=True)
+        return cls(
+            customers.groupby(cls.KEYS["customers"], as_index=False).agg(cls.TOTALS),
+            items.groupby(cls.KEYS["items"], as_index=False)["quantity"].sum(),
+            names.groupby(cls.KEYS["names"], as_index=False)["count"].sum(),
+        )
+
+    def update(self, items: pd.DataFrame) -> pd.Index:
+        """Replace the order dates of a batch with its rows; returns the phones of the customers touched.
+
+        Replacing rather than adding keeps a repeated batch from counting its visits twice.
+        """
+        days = batch_days(items)
+        batch = CustomerState.from_items(items)
+        replaced = self.customers[DAY].isin(days)
+        touched = pd.Index(self.customers.loc[replaced, "customer_phone"]).union(pd.Index(batch.customers["customer_phone"]))
+        self.customers = pd.concat([self.customers[~replaced], batch.customers], ignore_index=True)
+        self.items = pd.concat([self.items[~self.items[DAY].isin(days)], batch.items], ignore_index=True)
+        self.names = pd.concat([self.names[~self.names[DAY].isin(days)], batch.names], ignore_index=True)
+        return touched
+
+    # --- Totals over all dates ---
+    def customer_totals(self) -> pd.DataFrame:
+        return self.customers.groupby("customer_phone").agg(self.TOTALS)
+
+    def item_totals(self) -> pd.DataFrame:
+        return self.items.groupby(["customer_phone", "item_name"], as_index=False)["quantity"].sum()
+
+    def kpis(self, clusters: Optional[pd.Series] = None) -> pd.DataFrame:
+        """The customer KPI table, as `customer_kpis.customer_kpis` builds it from the full export."""
+        names = self.names.groupby(["customer_phone", "customer_name"], as_index=False)["count"].sum()
+        return kpi_table(self.customer_totals(), self.item_totals().groupby("customer_phone").size(), top_names(names), clusters)
+
+    def save(self, state_dir: Path = STATE_DIR) -> None:
+        for name in self.FILES:
+            write_state_table(getattr(self, name), state_dir / f"{name}.arrow")
+
+    @classmethod
+    def load(cls, state_dir: Path = STATE_DIR) -> Optional["CustomerState"]:
+        if not all((state_dir / f"{name}.arrow").exists() for name in cls.FILES):
+            return None
+        tables = [feather.read_table(state_dir / f"{name}.arrow").to_pandas() for name in cls.FILES]
+        if any(DAY not in table.columns for table in tables):
+            # Saved before the state was partitioned by order date; needs a rebuild
+            return None
+        return cls(*tables)
+
+
+def assign_clusters(kpis: pd.DataFrame, touched: pd.Index, model_path: Path) -> pd.DataFrame:
+    """Place new and changed customers by nearest centroid; everyone is reassigned after a due mini-batch refit.
+
+    Without a persisted model, one is seeded from the labels of the customers left untouched.
+    """
+    model = ClusterModel.load(model_path)
+    changed = kpis["customer_phone"].isin(touched)
+    if model is None:
+        if kpis.loc[~changed, "Cluster"].isna().all():
+            return kpis
+        model = ClusterModel.from_labels(kpis[~changed])
+    if model.refit_due():
+        model.partial_fit(kpis)
+        changed[:] = True
+    kpis.loc[changed, "Cluster"] = model.assign(kpis[changed]).to_numpy()
+    model.save(model_path)
+    return kpis
+
+
+# --- Entry points ---
+def read_output(path: Path) -> Optional[pd.DataFrame]:
+    return pd.read_csv(path, float_precision="round_trip") if path.exists() else None
+
+
+def rebuild_state(state_dir: Path = STATE_DIR) -> CustomerState:
+    """Build the product and customer state from the full export; needed once before the first refresh."""
+    items = load_order_items()
+    write_state_table(base_table(items), state_dir / f"{PRODUCTS_STATE}.arrow")
+    state = CustomerState.from_items(items)
+    state.save(state_dir)
+    return state
+
+
+def refresh(new_items: pd.DataFrame, state_dir: Path = STATE_DIR) -> List[Path]:
+    """Apply one batch of new order items to every KPI output it affects; returns the files written.
+
+    Every order date in the batch replaces what was applied for it before, so a batch can be re-run.
+    """
+    state = CustomerState.load(state_dir)
+    base = load_product_base(state_dir)
+    if state is None or base is None:
+        raise FileNotFoundError(f"No KPI state in {state_dir}; run `python kpi_refresh.py --rebuild` first")
+    if batch_days(new_items).empty:
+        return []
+
+    base = update_product_base(base, new_items)
+    written = write_product_kpis(product_tables(base))
+
+    invoices = invoice_partition(new_items)
+    path = kpi_output_path(INVOICES)
+    existing = read_output(path)
+    days = batch_days(new_items).strftime("%Y-%m-%d")
+    table = invoices if existing is None else replace_partitions(existing, invoices, "order_date_only", days=days)
+    write_kpi(table, path)
+    written.append(path)
+    # The miss-you target list follows the invoices it is computed from
+    written.append(write_targets(table))
+
+    touched = state.update(new_items)
+    if len(touched):
+        path = kpi_output_path(CUSTOMERS)
+        existing = read_output(path)
+        clusters = None
+        if existing is not None and "Cluster" in existing.columns:
+            phones = pd.to_numeric(existing["customer_phone"], errors="coerce").round().astype("Int64")
+            clusters = existing.set_axis(phones)["Cluster"]
+        kpis = assign_clusters(state.kpis(clusters), touched, state_dir / MODEL_PATH.name)
+        write_kpi(kpis, path)
+        written += [path, write_rfm_segments(kpis), write_top_items(state.item_totals())]
+    state.save(state_dir)
+    write_state_table(base, state_dir / f"{PRODUCTS_STATE}.arrow")
+
+    # Keep the manifests the agent tools answer from in step with the rewritten files
+    for root in KPI_ROOTS:
+        if manifest_path(root).exists() and any(Path(root).resolve() in path.resolve().parents for path in written):
+            refresh_manifest(root)
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("new_items", nargs="?", help="CSV export with only the new day's order items")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the customer state from the full export")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        state = rebuild_state()
+        print(f"🧱 KPI state rebuilt for {state.customers["customer_phone"].nunique()} customers in {STATE_DIR}")
+    if args.new_items:
+        for path in refresh(parse_order_items(args.new_items)):
+            print(f"✏️ {path}")
+        if list_outlets(KPI_ROOTS[0]):
+            print("ℹ️ Outlet partitions are not refreshed; rerun `python outlet_pipeline.py` to rebuild them")
+    elif not args.rebuild:
+        parser.error("give the new day's export or --rebuild")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import math
+import os
+import pandas as pd
+from typing import List
+
+# Upper bound on the size of a single tool return, in model tokens
+TOOL_TOKEN_BUDGET = int(os.getenv("TOOL_TOKEN_BUDGET", "1500"))
+# Pivots wider than this are summarised as top-N instead of printed
+WIDE_TABLE_COLUMNS = 30
+PIVOT_TOP_N = 8
+# Row-label columns written by the pivot exports, numeric or not
+PIVOT_LABEL_COLUMNS = {"Hour", "DayOfWeek", "item_name"}
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken is optional; fall back to the usual ~4 chars/token estimate
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def truncate_to_budget(text: str, budget: int) -> str:
+    if count_tokens(text) <= budget:
+        return text
+    lines = text.splitlines()
+    while lines and count_tokens("\n".join(lines)) > budget - 10:
+        lines.pop()
+    return "\n".join(lines) + "\n… (truncated to fit the token budget)"
+
+
+def with_token_footer(text: str, budget: int) -> str:
+    text = truncate_to_budget(text, budget)
+    return f"{text}\n🧮 ~{count_tokens(text)} tokens (budget {budget})"
+
+
+def format_column_list(columns: List[str], limit: int = 25) -> str:
+    if len(columns) <= limit:
+        return ", ".join(columns)
+    return ", ".join(columns[:limit]) + f", … (+{len(columns) - limit} more)"
+
+
+def format_kpi_summary(label: str, n_rows: int, columns: List[str], head: str, describe: str, head_rows: int = 5) -> str:
+    return f"""
+📊 KPI File Analysis
+Path: {label}
+Shape: {n_rows} rows, {len(columns)} columns
+Columns: {format_column_list(columns)}
+
+📋 First {head_rows} rows:
+{head}
+
+📈 Basic Statistics:
+{describe}
+        """
+
+
+def is_wide_pivot(df: pd.DataFrame) -> bool:
+    numeric = df.select_dtypes("number").shape[1]
+    return df.shape[1] > WIDE_TABLE_COLUMNS and numeric >= 0.9 * df.shape[1]
+
+
+def informative_columns(df: pd.DataFrame, max_columns: int) -> List[str]:
+    """Keep the label columns plus the numeric columns that vary the most relative to their mean."""
+    labels = [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])]
+    numeric = df.select_dtypes("number")
+    spread = (numeric.std() / numeric.mean().abs().replace(0, pd.NA)).fillna(0)
+    spread = spread[numeric.nunique() > 1].sort_values(ascending=False)
+    ranked = labels[: max(1, max_columns // 3)] + spread.index.tolist()
+    keep = set(ranked[:max_columns])
+    return [c for c in df.columns if c in keep]
+
+
+def pivot_digest(df: pd.DataFrame, top_n: int = PIVOT_TOP_N) -> str:
+    """Summarise a wide row x item pivot as the overall top items and the top items per row."""
+    labels = [c for c in df.columns if c in PIVOT_LABEL_COLUMNS or not pd.api.types.is_numeric_dtype(df[c])]
+    values = df.drop(columns=labels).select_dtypes("number")
+    row_names = df[labels[0]].astype(str) if labels else df.index.astype(str)
+
+    totals = values.sum().sort_values(ascending=False)
+    lines = [f"🏆 Top {top_n} columns overall: " + ", ".join(f"{k} {v:g}" for k, v in totals.head(top_n).items())]
+    for name, (_, row) in zip(row_names, values.iterrows()):
+        top = row.sort_values(ascending=False).head(top_n)
+        lines.append(f"• {name} (total {row.sum():g}): " + ", ".join(f"{k} {v:g}" for k, v in top.items()))
+    return "\n".join(lines)
+
+
+def render_kpi_summary(label: str, df: pd.DataFrame, n_rows: int, columns: List[str], budget: int = TOOL_TOKEN_BUDGET) -> str:
+    """Summarise a KPI table for an agent, shrinking the output until it fits `budget` tokens."""
+    if is_wide_pivot(df):
+        for top_n in (PIVOT_TOP_N, 5, 3):
+            text = f"""
+📊 KPI File Analysis (wide pivot, summarised)
+Path: {label}
+Shape: {n_rows} rows, {len(columns)} columns
+
+{pivot_digest(df, top_n)}
+        """
+            if count_tokens(text) <= budget:
+                break
+        return with_token_footer(text, budget)
+
+    for max_columns, head_rows in ((len(df.columns), 5), (12, 5), (8, 3), (5, 3), (3, 2)):
+        shown = informative_columns(df, max_columns)
+        numeric = df[shown].select_dtypes("number")
+        describe = numeric.describe().T.to_string() if not numeric.empty else "(no numeric columns)"
+        text = format_kpi_summary(label, n_rows, columns, df[shown].head(head_rows).to_string(), describe, head_rows)
+        if count_tokens(text) <= budget:
+            break
+    return with_token_footer(text, budget)
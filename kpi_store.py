@@ -0,0 +1,144 @@
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from pathlib import Path
+from typing import List, Optional
+
+# Folders holding the KPI CSVs written by the analysis notebooks
+KPI_ROOTS = ["./results", "./order_analysis", "./product_analysis"]
+
+COLUMNAR_SUFFIX = ".arrow"
+
+# Per-outlet partitions of every KPI output, under the results folder
+OUTLETS_DIR = "outlets"
+
+# Columns that hold timestamps / calendar dates in the KPI outputs
+DATE_COLUMNS = {"order_date", "order_date_only", "Order_Date", "First_Order"}
+# Columns that are identifiers and must not be treated as floats
+ID_COLUMNS = {"customer_phone", "invoice_no"}
+
+
+def columnar_path(csv_path: Path) -> Path:
+    return Path(csv_path).with_suffix(COLUMNAR_SUFFIX)
+
+
+def outlet_slug(outlet: str) -> str:
+    """Folder name of an outlet, e.g. 'Makers of Milkshakes - Prozone Mall' -> 'makers-of-milkshakes-prozone-mall'."""
+    return re.sub(r"[^a-z0-9]+", "-", outlet.lower()).strip("-")
+
+
+def outlet_folder(kpi_base_folder: str, outlet: Optional[str] = None) -> Path:
+    """KPI folder of one outlet's partition, or the all-outlet folder when no outlet is given."""
+    base = Path(kpi_base_folder)
+    return base / OUTLETS_DIR / outlet_slug(outlet) if outlet else base
+
+
+def list_outlets(kpi_base_folder: str) -> List[str]:
+    """Outlets with a KPI partition under the base folder, by folder name."""
+    outlets = Path(kpi_base_folder) / OUTLETS_DIR
+    return sorted(path.name for path in outlets.iterdir() if path.is_dir()) if outlets.exists() else []
+
+
+def locate_kpi_file(kpi_base_folder: str, rel_path: str) -> Optional[Path]:
+    """Find a KPI file in the agent's base folder or, for the all-outlet results folder, the project root.
+
+    Outlet partitions hold all of their outputs, so they never fall back to the all-outlet files.
+    """
+    roots = [Path(kpi_base_folder)]
+    if OUTLETS_DIR not in Path(kpi_base_folder).parts:
+        roots.append(Path("."))
+    for root in roots:
+        path = root / rel_path
+        if path.exists():
+            return path
+    return None
+
+
+def kpi_output_path(rel_path: str, root: Optional[Path] = None) -> Path:
+    """Where to write an output: under `root` if given, else where it already is, else the results folder."""
+    if root is not None:
+        return Path(root) / rel_path
+    return locate_kpi_file(KPI_ROOTS[0], rel_path) or Path(KPI_ROOTS[0]) / rel_path
+
+
+def is_columnar_fresh(csv_path: Path) -> bool:
+    """True if the Arrow copy of `csv_path` exists and is not older than the CSV."""
+    arrow_path = columnar_path(csv_path)
+    if not arrow_path.exists():
+        return False
+    if not Path(csv_path).exists():
+        return True
+    return arrow_path.stat().st_mtime >= Path(csv_path).stat().st_mtime
+
+
+def type_kpi_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Give the CSV-parsed KPI frame proper column types before it is stored."""
+    df = df.copy()
+    for col in df.columns:
+        if col in DATE_COLUMNS:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif col in ID_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors="coerce").round().astype("Int64")
+        elif df[col].dtype == object and df[col].nunique(dropna=True) <= max(1, len(df) // 2):
+            df[col] = df[col].astype("category")
+    # Arrow requires string column names (pivot CSVs may have numeric headers)
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+
+def write_columnar(df: pd.DataFrame, csv_path: Path) -> Path:
+    """Write `df` uncompressed in Arrow IPC format next to `csv_path` so it can be memory mapped."""
+    arrow_path = columnar_path(csv_path)
+    table = pa.Table.from_pandas(type_kpi_frame(df), preserve_index=False)
+    feather.write_feather(table, arrow_path, compression="uncompressed")
+    return arrow_path
+
+
+def write_kpi(df: pd.DataFrame, csv_path, index: bool = False) -> None:
+    """Write a KPI table as CSV plus its columnar copy."""
+    csv_path = Path(csv_path)
+    df.to_csv(csv_path, index=index)
+    write_columnar(df.reset_index() if index else df, csv_path)
+
+
+def read_schema(csv_path: Path) -> Optional[pa.Schema]:
+    """Schema of the Arrow copy, read from the file footer without touching the data."""
+    if not is_columnar_fresh(csv_path):
+        return None
+    with pa.memory_map(str(columnar_path(csv_path)), "r") as source:
+        return pa.ipc.open_file(source).schema
+
+
+def count_rows(csv_path: Path) -> Optional[int]:
+    if not is_columnar_fresh(csv_path):
+        return None
+    with pa.memory_map(str(columnar_path(csv_path)), "r") as source:
+        reader = pa.ipc.open_file(source)
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+
+def read_kpi_table(csv_path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Load a KPI table, preferring the memory-mapped Arrow copy and only the requested columns."""
+    csv_path = Path(csv_path)
+    if is_columnar_fresh(csv_path):
+        table = feather.read_table(columnar_path(csv_path), columns=columns, memory_map=True)
+        return table.to_pandas()
+    return pd.read_csv(csv_path, usecols=columns)
+
+
+def export_columnar(root: str, force: bool = False) -> List[Path]:
+    """Create or refresh the Arrow copy of every KPI CSV under `root`."""
+    written = []
+    for csv_path in sorted(Path(root).rglob("*.csv")):
+        if not force and is_columnar_fresh(csv_path):
+            continue
+        written.append(write_columnar(pd.read_csv(csv_path), csv_path))
+    return written
+
+
+if __name__ == "__main__":
+    for root in KPI_ROOTS:
+        if Path(root).exists():
+            for path in export_columnar(root):
+                print(f"📦 {path}")
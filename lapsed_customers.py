@@ -0,0 +1,157 @@
+"""Lapsed customers: who is overdue for a visit relative to their own cadence.
+
+From the invoice table, every customer's distinct visit days are sorted once; the gaps between
+consecutive visits come from one numpy diff over the whole array, and each customer's median and
+90th-percentile gap are read off that sorted array at per-customer offsets, so no Python code runs
+per customer. A customer is lapsed when the days since their last visit exceed their p90 gap and
+are at least `OVERDUE_RATIO` times their median gap. Customers with a single visit have no
+cadence of their own and are measured against the median and p90 gap of everyone else.
+
+The lapsed customers are written as a miss-you target list, most valuable and most overdue first,
+split into campaign batches:
+
+    python lapsed_customers.py [--batch-size 500] [--overdue-ratio 2]
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Optional, Tuple
+
+from kpi_store import KPI_ROOTS, kpi_output_path, locate_kpi_file, read_kpi_table, write_kpi
+
+INVOICES = "order_analysis/Invoice_Aggregation.csv"
+TARGETS = "customer_analysis/Miss_You_Targets.csv"
+
+# Days since the last visit must reach this multiple of the customer's median gap
+OVERDUE_RATIO = float(os.getenv("LAPSED_OVERDUE_RATIO", "2"))
+# Customers per campaign batch of the target list
+BATCH_SIZE = int(os.getenv("MISS_YOU_BATCH_SIZE", "500"))
+
+
+def grouped_quantile(values: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """Linear-interpolated quantile of every group of `values`, sorted within contiguous groups."""
+    position = (counts - 1) * q
+    lower = np.floor(position).astype("int64")
+    upper = np.ceil(position).astype("int64")
+    low, high = values[starts + lower], values[starts + upper]
+    return low + (high - low) * (position - lower)
+
+
+def visit_gaps(invoices: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Per-customer visit count, last visit, median and p90 gap (NaN below two visits); and all gaps."""
+    known = invoices[invoices["customer_phone"].notna()]
+    phone_codes, phones = pd.factorize(pd.to_numeric(known["customer_phone"]).round().astype("int64"))
+    days = pd.to_datetime(known["order_date_only"], format="%Y-%m-%d").to_numpy().astype("datetime64[D]").astype("int64")
+
+    # Distinct visit days in (customer, day) order
+    visits = np.unique(phone_codes.astype("int64") << 32 | (days - days.min()))
+    customer, day = visits >> 32, (visits & 0xFFFFFFFF) + days.min()
+    first = np.r_[True, customer[1:] != customer[:-1]]
+    starts = np.flatnonzero(first)
+    n_visits = np.diff(np.r_[starts, len(visits)])
+
+    # Gaps between consecutive visits of the same customer, sorted within each customer
+    gaps = np.diff(day)[~first[1:]]
+    gap_customer = customer[1:][~first[1:]]
+    gaps = gaps[np.lexsort((gaps, gap_customer))]
+    n_gaps = n_visits - 1
+    has_gaps = n_gaps > 0
+    gap_starts = np.r_[0, np.cumsum(n_gaps)[:-1]]
+
+    median = np.full(len(starts), np.nan)
+    p90 = np.full(len(starts), np.nan)
+    median[has_gaps] = grouped_quantile(gaps, gap_starts[has_gaps], n_gaps[has_gaps], 0.5)
+    p90[has_gaps] = grouped_quantile(gaps, gap_starts[has_gaps], n_gaps[has_gaps], 0.9)
+
+    stats = pd.DataFrame({
+        "visits": n_visits,
+        "last_visit": (day[starts + n_visits - 1]).astype("datetime64[D]"),
+        "median_gap": median,
+        "p90_gap": p90,
+    }, index=pd.Index(phones[customer[starts]], name="customer_phone"))
+    return stats, gaps
+
+
+def lapsed_customers(invoices: pd.DataFrame, overdue_ratio: float = OVERDUE_RATIO) -> pd.DataFrame:
+    """Gap statistics and the lapsed flag of every known customer, as of the latest invoice day."""
+    stats, gaps = visit_gaps(invoices)
+    as_of = stats["last_visit"].max()
+    stats["days_since_last"] = (as_of - stats["last_visit"]).dt.days
+    stats["own_cadence"] = stats["median_gap"].notna()
+    if len(gaps):
+        stats["median_gap"] = stats["median_gap"].fillna(float(np.median(gaps)))
+        stats["p90_gap"] = stats["p90_gap"].fillna(float(np.quantile(gaps, 0.9)))
+    stats["overdue_ratio"] = (stats["days_since_last"] / stats["median_gap"].clip(lower=1)).round(2)
+    stats["lapsed"] = (stats["days_since_last"] > stats["p90_gap"]) & (stats["overdue_ratio"] >= overdue_ratio)
+
+    known = invoices[invoices["customer_phone"].notna()]
+    phones = pd.to_numeric(known["customer_phone"]).round().astype("int64")
+    spend = known.groupby(phones)["net_invoice_value"].agg(["sum", "mean"])
+    stats["total_spend"] = spend["sum"].reindex(stats.index).round(2)
+    stats["avg_invoice_value"] = spend["mean"].reindex(stats.index).round(2)
+    stats["customer_name"] = known.groupby(phones)["customer_name"].last().reindex(stats.index)
+    return stats.reset_index()
+
+
+def target_list(customers: pd.DataFrame, batch_size: int = BATCH_SIZE) -> pd.DataFrame:
+    """Lapsed customers, those with their own cadence and the highest spend first, numbered into batches."""
+    targets = customers[customers["lapsed"]].sort_values(
+        ["own_cadence", "total_spend", "overdue_ratio"], ascending=False, ignore_index=True,
+    )
+    targets.insert(0, "batch", np.arange(len(targets)) // max(batch_size, 1) + 1)
+    return targets.drop(columns="lapsed")
+
+
+def write_targets(invoices: pd.DataFrame, root: Optional[Path] = None, batch_size: int = BATCH_SIZE,
+                  overdue_ratio: float = OVERDUE_RATIO) -> Path:
+    targets = target_list(lapsed_customers(invoices, overdue_ratio), batch_size)
+    path = kpi_output_path(TARGETS, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_kpi(targets, path)
+    return path
+
+
+def summarize_targets(customers: pd.DataFrame, top_n: int = 10) -> str:
+    """Overview of the lapsed customers for the miss-you coupon: size, cadence, overdue spread and value."""
+    lapsed = customers[customers["lapsed"]]
+    own = customers[customers["own_cadence"]]
+    lines = [
+        f"🕰️ Lapsed customers: {len(lapsed)} of {len(customers)} known customers "
+        f"({len(lapsed[lapsed['own_cadence']])} repeat visitors overdue on their own cadence)",
+        f"Repeat visitors: {len(own)}; median gap {own['median_gap'].median():.0f} days, "
+        f"p90 gap {own['p90_gap'].median():.0f} days (medians over customers)",
+        f"Single-visit customers are measured against the overall median gap of "
+        f"{customers.loc[~customers['own_cadence'], 'median_gap'].max():.0f} days",
+    ]
+    if len(lapsed):
+        days = lapsed["days_since_last"].quantile([0.25, 0.5, 0.75])
+        ratio = lapsed["overdue_ratio"].quantile([0.25, 0.5, 0.75])
+        lines += [
+            f"Days since last visit (p25/p50/p75): {days[0.25]:.0f} / {days[0.5]:.0f} / {days[0.75]:.0f}",
+            f"Overdue ratio (p25/p50/p75): {ratio[0.25]:.1f} / {ratio[0.5]:.1f} / {ratio[0.75]:.1f}",
+            f"Spend of lapsed customers: {lapsed['total_spend'].sum():,.0f} total, "
+            f"{lapsed['avg_invoice_value'].mean():,.0f} average invoice",
+            "",
+            f"Top {min(top_n, len(lapsed))} by spend:",
+            target_list(customers).head(top_n)[
+                ["customer_name", "visits", "days_since_last", "median_gap", "overdue_ratio", "total_spend"]
+            ].to_string(index=False),
+        ]
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--overdue-ratio", type=float, default=OVERDUE_RATIO)
+    args = parser.parse_args()
+    invoices = locate_kpi_file(KPI_ROOTS[0], INVOICES)
+    if invoices is None:
+        parser.error(f"{INVOICES} not found; run the order notebook first")
+    print(f"📦 {write_targets(read_kpi_table(invoices), None, args.batch_size, args.overdue_ratio)}")
+
+
+if __name__ == "__main__":
+    main()
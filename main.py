@@ -1,11 +1,15 @@
 from pydantic_ai import Agent
 from pydantic_ai.providers.openai import OpenAIProvider
 from pydantic_ai.models.openai import OpenAIModel, OpenAIModelName, OpenAIModelSettings
-from pydantic_ai.messages import ModelMessage
+from pydantic_ai.messages import ModelMessage, ModelRequest, SystemPromptPart, UserPromptPart
 from openai import AsyncOpenAI
 from pydantic import BaseModel, Field
 import logfire
 from tools import *
+from history import ConversationHistory, RunRecord, structured_response
+from coupon_cache import coupon_cache, coupon_cache_key
+from kpi_digest import DIGEST_FILES, kpi_digest
+from agent_service import agent_service
 from settings import Settings
 import asyncio
 
@@ -17,10 +21,6 @@ logfire.instrument_pydantic_ai()
 openai_client = AsyncOpenAI(api_key=settings.openai_api_key)
 logfire.instrument_openai(openai_client=openai_client)
 
-@dataclass
-class Deps:
-    kpi_base_folder: str
-
 # Model Settings
 model_settings = OpenAIModelSettings(
     temperature=0.1,
@@ -38,7 +38,14 @@ chat_model: OpenAIModel = OpenAIModel(model_name=MODEL_NAME_CHAT, provider=OpenA
 # --- Shared Tools ---
 tools = [
     explore_kpi_structure,
-    load_kpi_file
+    load_kpi_file,
+    query_kpi_table,
+    get_item_associations,
+    summarize_lapsed_customers,
+    slice_sales,
+    get_customer_profile,
+    list_customers,
+    simulate_coupon
 ]
 
 
@@ -47,24 +54,29 @@ class StandardResponse(BaseModel):
     # joining bonus coupon
     joining_bonus_coupon : str = Field(description="Best Joining Bonus Coupon to bring more footfall to the stores")
     joining_bonus_coupon_reasoning : str = Field(description="Best Joining Bonus Coupon to bring more footfall to the stores")
-    joining_bonus_coupon_cost_analysis : str = Field(description="Analyze the cost of the joining bonus coupon, like 'How many orders/sales would increase?','How much discount they are going to spend?'")
+    joining_bonus_coupon_cost_analysis : str = Field(description="Analyze the cost of the joining bonus coupon, with the discount spend and incremental revenue from the simulate_coupon tool (mean and p5-p95 range)")
     # stamp card coupon
     stamp_card_coupon : str = Field(description="Best Stamp Card Coupon to bring more footfall to the stores")
     stamp_card_coupon_reasoning : str = Field(description="Reasoning behind the suggested stamp card coupon")
-    stamp_card_coupon_cost_analysis : str = Field(description="Analyze the cost of the stamp card coupon, like 'How many orders/sales would increase?','How much discount they are going to spend?'")
+    stamp_card_coupon_cost_analysis : str = Field(description="Analyze the cost of the stamp card coupon, with the discount spend and incremental revenue from the simulate_coupon tool (mean and p5-p95 range)")
     # miss you coupon
     miss_you_coupon : str = Field(description="Best Miss You Coupon to bring more footfall to the stores")
     miss_you_coupon_reasoning : str = Field(description="Reasoning behind the suggested miss you coupon")
-    miss_you_coupon_cost_analysis : str = Field(description="Analyze the cost of the miss you coupon, like 'How many orders/sales would increase?','How much discount they are going to spend?'")
+    miss_you_coupon_cost_analysis : str = Field(description="Analyze the cost of the miss you coupon, with the discount spend and incremental revenue from the simulate_coupon tool (mean and p5-p95 range)")
     # combined cost analysis
-    combined_cost_analysis : str = Field(description="Analyze the cost of all the coupons, like 'How many orders/sales would increase?','How much discount they are going to spend?'")
+    combined_cost_analysis : str = Field(description="Analyze the cost of all the coupons, with the discount spend and incremental revenue from the simulate_coupon tool (mean and p5-p95 range)")
 
 class CreativeResponse(BaseModel):
     coupons: str = Field(description="Best Coupons to bring more footfall to the stores")
     reasoning: str = Field(description="Reasoning behind the suggested coupons")
-    cost: str = Field(description="How many orders/sales would increase. How much discount they are going to spend")
+    cost: str = Field(description="Discount spend and incremental revenue of the coupons from the simulate_coupon tool (mean and p5-p95 range)")
     conversation : str = Field(description="Use this field to respond normally if none other fields fit for the answer")
 
+class CouponPlan(BaseModel):
+    coupon : str = Field(description="The exact coupon terms")
+    reasoning : str = Field(description="Reasoning behind the suggested coupon, grounded in the KPI data")
+    cost_analysis : str = Field(description="Analyze the cost of the coupon, with the discount spend and incremental revenue from the simulate_coupon tool (mean and p5-p95 range)")
+
 
 # --- Prompt Definitions ---
 with open("prompts/standard_coupon.txt", "r", encoding="utf-8") as f:
@@ -76,6 +88,18 @@ with open("prompts/creative_coupon.txt", "r", encoding="utf-8") as f:
 with open("prompts/chat.txt", "r", encoding="utf-8") as f:
     chat_prompt = f.read()
 
+with open("prompts/joining_bonus.txt", "r", encoding="utf-8") as f:
+    joining_bonus_prompt = f.read()
+
+with open("prompts/stamp_card.txt", "r", encoding="utf-8") as f:
+    stamp_card_prompt = f.read()
+
+with open("prompts/miss_you.txt", "r", encoding="utf-8") as f:
+    miss_you_prompt = f.read()
+
+with open("prompts/coupon_merge.txt", "r", encoding="utf-8") as f:
+    coupon_merge_prompt = f.read()
+
 
 # --- Agents ---
 standard_coupon_agent = Agent[Deps, StandardResponse](
@@ -105,18 +129,121 @@ chat_agent = Agent(
     intstrument=True
 )
 
-message_history: list[ModelMessage] = []
+# Specialised sub-agents for the fan-out mode of the standard coupons
+def coupon_plan_agent(system_prompt: str) -> Agent[Deps, CouponPlan]:
+    return Agent[Deps, CouponPlan](
+        model=coupon_model,
+        model_settings=model_settings,
+        output_type=CouponPlan,
+        system_prompt=system_prompt,
+        tools=tools,
+        deps_type=Deps,
+        instrument=True
+    )
+
+joining_bonus_agent = coupon_plan_agent(joining_bonus_prompt)
+stamp_card_agent = coupon_plan_agent(stamp_card_prompt)
+miss_you_agent = coupon_plan_agent(miss_you_prompt)
+
+# Every coupon agent gets the precomputed KPI digest as instructions, so the agents call tools only to
+# drill down. pydantic-ai sends instructions as the first system message, ahead of the static prompt;
+# the digest only changes with the data, so the prefix the provider can prompt-cache stays the same
+# between data refreshes. Instructions are evaluated on every run, also when a message history is
+# passed, so a data refresh reaches ongoing conversations. Built on the tool pool like all KPI reads.
+async def kpi_digest_prompt(ctx: RunContext[Deps]) -> str:
+    return await run_blocking(kpi_digest, ctx.deps.kpi_folder)
+
+for agent in (standard_coupon_agent, creative_coupon_agent, joining_bonus_agent, stamp_card_agent, miss_you_agent):
+    agent.instructions(kpi_digest_prompt)
+
+coupon_merge_agent = Agent(
+    model=chat_model,
+    model_settings=model_settings,
+    system_prompt=coupon_merge_prompt,
+    instrument=True
+)
+
+
+# --- Fan-out Standard Coupons ---
+def structured_turn(system_prompt: str, user_prompt: str, output: BaseModel, message_history: list[ModelMessage]) -> list[ModelMessage]:
+    """Conversation messages for a turn whose structured output was produced outside a single agent run."""
+    # Like pydantic-ai, only send the system prompt when the conversation starts
+    parts = [] if message_history else [SystemPromptPart(system_prompt)]
+    return message_history + [
+        ModelRequest(parts=parts + [UserPromptPart(user_prompt)]),
+        structured_response(output.model_dump_json(indent=2)),
+    ]
+
+async def run_standard_coupons_fanout(user_prompt: str, deps: Deps, message_history: list[ModelMessage] = None) -> RunRecord:
+    """Generate the three standard coupons with one sub-agent each, running concurrently, then merge the costs.
+
+    The sub-agents share the KPI digest through their system prompts.
+    """
+    joining, stamp, miss_you = await asyncio.gather(
+        joining_bonus_agent.run(user_prompt, deps=deps),
+        stamp_card_agent.run(user_prompt, deps=deps),
+        miss_you_agent.run(user_prompt, deps=deps),
+    )
+
+    plans = "\n\n".join(
+        f"## {title}\nCoupon: {plan.output.coupon}\nCost analysis: {plan.output.cost_analysis}"
+        for title, plan in (("Joining Bonus", joining), ("Stamp Card", stamp), ("Miss You", miss_you))
+    )
+    combined = await coupon_merge_agent.run(plans)
+
+    output = StandardResponse(
+        joining_bonus_coupon=joining.output.coupon,
+        joining_bonus_coupon_reasoning=joining.output.reasoning,
+        joining_bonus_coupon_cost_analysis=joining.output.cost_analysis,
+        stamp_card_coupon=stamp.output.coupon,
+        stamp_card_coupon_reasoning=stamp.output.reasoning,
+        stamp_card_coupon_cost_analysis=stamp.output.cost_analysis,
+        miss_you_coupon=miss_you.output.coupon,
+        miss_you_coupon_reasoning=miss_you.output.reasoning,
+        miss_you_coupon_cost_analysis=miss_you.output.cost_analysis,
+        combined_cost_analysis=combined.output,
+    )
+    # Only the request and the merged strategy go into the conversation, not the sub-agent tool traffic
+    messages = structured_turn(standard_coupon_prompt, user_prompt, output, message_history or [])
+    usage = joining.usage() + stamp.usage() + miss_you.usage() + combined.usage()
+    return RunRecord(output=output, messages=messages, run_usage=usage)
+
+
+# --- Coupon Result Cache ---
+# System prompts and output types of the cacheable coupon runs
+COUPON_RUNS = {
+    "standard": (standard_coupon_prompt, StandardResponse),
+    "standard-fanout": ("\n".join([joining_bonus_prompt, stamp_card_prompt, miss_you_prompt, coupon_merge_prompt]), StandardResponse),
+    "creative": (creative_coupon_prompt, CreativeResponse),
+}
+
+def coupon_run_key(kind: str, user_prompt: str, deps: Deps) -> str:
+    system_prompt, _ = COUPON_RUNS[kind]
+    return coupon_cache_key(kind, MODEL_NAME_COUPON, model_settings, system_prompt, user_prompt, kpi_data_fingerprint(deps.kpi_folder, DIGEST_FILES))
+
+def load_cached_coupon_run(kind: str, user_prompt: str, deps: Deps, message_history: list[ModelMessage]) -> RunRecord | None:
+    """Return the stored strategy for this prompt if the KPI data it was built from has not changed."""
+    system_prompt, output_type = COUPON_RUNS[kind]
+    output = coupon_cache.get(coupon_run_key(kind, user_prompt, deps), output_type)
+    if output is None:
+        return None
+    return RunRecord(output=output, messages=structured_turn(system_prompt, user_prompt, output, message_history))
+
+def store_coupon_run(kind: str, user_prompt: str, deps: Deps, output: BaseModel) -> None:
+    coupon_cache.put(coupon_run_key(kind, user_prompt, deps), kind, output)
 
 if __name__ == "__main__":
 
     deps = Deps(kpi_base_folder="./results")  # Set your KPI base folder path
+    history = ConversationHistory()
     
     while True:
         user_prompt = input("You: ")
         if user_prompt == "exit":
             break
         
-        result = asyncio.run(chat_agent.run(user_prompt=user_prompt, message_history=message_history, deps=deps))
+        result = agent_service.run_turn(chat_agent, user_prompt, history, deps)
         print("Clink: " + str(result.output))
 
-        message_history = result.all_messages()
\ No newline at end of file
+        metrics = history.turn_metrics[-1]
+        print(f"(prompt: {metrics['request_tokens']} tokens, history kept: {metrics['kept_tokens']} tokens)")
\ No newline at end of file
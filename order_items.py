@@ -0,0 +1,127 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from kpi_store import columnar_path, is_columnar_fresh
+
+# POS order-item export every analysis notebook starts from
+ORDER_ITEMS_CSV = Path(__file__).parent / "analysis" / "Year Order Item Data.csv"
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Rows per chunk when streaming an export that may not fit in memory
+CHUNK_ROWS = int(os.getenv("ORDER_ITEMS_CHUNK_ROWS", "100000"))
+
+# Explicit schema of the export
+DATETIME_COLUMNS = ["date"]
+ID_COLUMNS = ["invoice_no", "customer_phone"]
+CATEGORICAL_COLUMNS = [
+    "restaurant_name", "payment_type", "order_type", "status", "area", "virtual_brand_name",
+    "brand_grouping", "assign_to", "customer_address", "order_cancel_reason", "item_name", "category_name",
+]
+STRING_COLUMNS = ["customer_name", "sap_code"]
+COUNT_COLUMNS = ["item_quantity"]
+AMOUNT_COLUMNS = [
+    "persons", "my_amount", "total_tax", "discount", "delivery_charge", "container_charge", "service_charge",
+    "additional_charge", "waived_off", "round_off", "total", "item_price", "item_total",
+]
+
+
+def type_order_items(df: pd.DataFrame) -> pd.DataFrame:
+    """Apply the export schema to a frame read with every column as text."""
+    for col in DATETIME_COLUMNS:
+        df[col] = pd.to_datetime(df[col], format=DATE_FORMAT, errors="coerce")
+    # Phones and invoice numbers are identifiers: whole numbers, never floats like 3341804938.0
+    for col in ID_COLUMNS + COUNT_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").round().astype("Int64")
+    for col in AMOUNT_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype("category")
+    return df
+
+
+def csv_dtypes() -> dict:
+    dtypes = {col: "category" for col in CATEGORICAL_COLUMNS}
+    dtypes.update({col: "string" for col in DATETIME_COLUMNS + ID_COLUMNS + COUNT_COLUMNS + AMOUNT_COLUMNS})
+    dtypes.update({col: "object" for col in STRING_COLUMNS})
+    return dtypes
+
+
+def parse_order_items(csv_path=ORDER_ITEMS_CSV) -> pd.DataFrame:
+    """Parse the raw CSV export with the explicit schema. No rows are filtered."""
+    return type_order_items(pd.read_csv(csv_path, dtype=csv_dtypes()))
+
+
+def iter_xlsx_rows(xlsx_path, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise ImportError("Reading .xlsx exports requires openpyxl: pip install openpyxl") from e
+
+    # Read-only mode streams the sheet XML instead of building the whole workbook in memory
+    workbook = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(name) for name in next(rows)]
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_rows:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def iter_order_items(path=ORDER_ITEMS_CSV, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Stream a CSV or XLSX export as typed chunks of at most `chunk_rows` rows."""
+    path = Path(path)
+    if path.suffix.lower() == ".xlsx":
+        for chunk in iter_xlsx_rows(path, chunk_rows):
+            for col in DATETIME_COLUMNS:
+                chunk[col] = chunk[col].astype(str)
+            yield type_order_items(chunk)
+        return
+    with pd.read_csv(path, dtype=csv_dtypes(), chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield type_order_items(chunk)
+
+
+def write_order_items(df: pd.DataFrame, csv_path=ORDER_ITEMS_CSV) -> Path:
+    """Persist the typed export uncompressed in Arrow IPC format next to the CSV."""
+    arrow_path = columnar_path(csv_path)
+    feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), arrow_path, compression="uncompressed")
+    return arrow_path
+
+
+def item_sales(df: pd.DataFrame) -> pd.DataFrame:
+    """Successful, positive item lines with their net sales, as used by the product analysis."""
+    df = df.dropna(subset=["date", "item_name", "item_quantity", "item_price", "item_total"])
+    df = df[(df["status"].str.lower() == "success") & (df["item_quantity"] > 0) & (df["item_total"] > 0)].copy()
+    df["net_sales"] = df["item_total"] - df["discount"].fillna(0) - df["waived_off"].fillna(0)
+    return df
+
+
+def load_order_items(csv_path=ORDER_ITEMS_CSV, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Typed order items, parsed once and then memory mapped from the columnar cache.
+
+    The cache is rebuilt whenever the CSV export is newer than it.
+    """
+    csv_path = Path(csv_path)
+    if not is_columnar_fresh(csv_path):
+        df = parse_order_items(csv_path)
+        write_order_items(df, csv_path)
+        return df[columns] if columns else df
+    return feather.read_table(columnar_path(csv_path), columns=columns, memory_map=True).to_pandas()
+
+
+if __name__ == "__main__":
+    df = parse_order_items()
+    path = write_order_items(df)
+    print(f"📦 {path}: {len(df)} rows, {df.memory_usage(deep=True).sum() / 1e6:.1f} MB in memory")
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Optional
+
+from order_items import CHUNK_ROWS, ORDER_ITEMS_CSV, item_sales, iter_order_items
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# (key, invoice) pairs are packed into one int64: key code in the high bits, invoice number below
+INVOICE_BITS = 40
+
+
+class ProductAggregates:
+    """Running product KPIs over a stream of order-item chunks.
+
+    Sums are kept as one row per item, weekday and hour. Distinct order counts need the set of
+    (key, invoice) pairs seen so far, because invoice numbers restart and the same number can
+    reappear anywhere in the export. They are kept as sorted packed int64 arrays, 8 bytes per
+    distinct pair, so memory grows with distinct pairs rather than with rows read.
+    Produces the same tables as the product analysis notebook.
+    """
+
+    def __init__(self):
+        self.items: Optional[pd.DataFrame] = None
+        self.days: Optional[pd.DataFrame] = None
+        self.hours: Optional[pd.DataFrame] = None
+        self.invoices: Dict[str, np.ndarray] = {}
+        self.key_codes: Dict[str, Dict] = {}
+        self.rows_read = 0
+
+    @staticmethod
+    def _accumulate(total: Optional[pd.DataFrame], part: pd.DataFrame) -> pd.DataFrame:
+        return part if total is None else total.add(part, fill_value=0)
+
+    def _add_invoices(self, sales: pd.DataFrame, key: str) -> None:
+        codes = self.key_codes.setdefault(key, {})
+        for value in sales[key].unique():
+            codes.setdefault(value, len(codes))
+        # Like nunique, lines without an invoice number count towards the sums but not the orders
+        sales = sales[sales["invoice_no"].notna()]
+        key_codes = sales[key].map(codes).to_numpy(dtype="int64")
+        pairs = np.unique((key_codes << INVOICE_BITS) | sales["invoice_no"].to_numpy(dtype="int64"))
+        self.invoices[key] = np.union1d(self.invoices[key], pairs) if key in self.invoices else pairs
+
+    def _distinct_invoices(self, key: str) -> pd.Series:
+        counts = np.bincount(self.invoices[key] >> INVOICE_BITS, minlength=len(self.key_codes[key]))
+        return pd.Series(counts, index=list(self.key_codes[key]))
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """Fold one chunk into the running totals."""
+        self.rows_read += len(chunk)
+        sales = item_sales(chunk)
+        if sales.empty:
+            return
+        sales["item_name"] = sales["item_name"].astype(str)
+        sales["DayOfWeek"] = sales["date"].dt.day_name()
+        sales["Hour"] = sales["date"].dt.hour
+
+        self.items = self._accumulate(self.items, sales.groupby("item_name").agg(
+            total_units_sold=("item_quantity", "sum"),
+            total_net_sales=("net_sales", "sum"),
+            price_sum=("item_price", "sum"),
+            price_count=("item_price", "count"),
+        ))
+        for attr, key in (("days", "DayOfWeek"), ("hours", "Hour")):
+            setattr(self, attr, self._accumulate(getattr(self, attr), sales.groupby(key).agg(
+                units_sum=("item_quantity", "sum"),
+                net_sales_sum=("net_sales", "sum"),
+                lines=("item_quantity", "count"),
+            )))
+        for key in ("item_name", "DayOfWeek", "Hour"):
+            self._add_invoices(sales, key)
+
+    def _averages(self, totals: pd.DataFrame, key: str) -> pd.DataFrame:
+        return pd.DataFrame({
+            "avg_units_sold": totals["units_sum"] / totals["lines"],
+            "avg_net_sales": totals["net_sales_sum"] / totals["lines"],
+            "avg_orders": self._distinct_invoices(key).reindex(totals.index).astype("int64"),
+        })
+
+    def results(self) -> Dict[str, pd.DataFrame]:
+        """Yearly item performance and the per-weekday and per-hour averages."""
+        items = self.items.copy()
+        yearly = pd.DataFrame({
+            "total_units_sold": items["total_units_sold"].astype("int64"),
+            "total_net_sales": items["total_net_sales"],
+            "average_selling_price": items["price_sum"] / items["price_count"],
+            "orders_count": self._distinct_invoices("item_name").reindex(items.index).astype("int64"),
+        })
+        yearly["weighted_avg_price"] = yearly["total_net_sales"] / yearly["total_units_sold"]
+        yearly = yearly.rename_axis("item_name").reset_index().sort_values(by="total_units_sold", ascending=False)
+
+        by_day = self._averages(self.days, "DayOfWeek").reindex(WEEKDAYS).rename_axis("DayOfWeek").reset_index()
+        by_hour = self._averages(self.hours, "Hour").sort_index().rename_axis("Hour").reset_index()
+        return {
+            "Yearly_Product_Performance": yearly,
+            "Average_Performance_By_DayOfWeek": by_day,
+            "Average_Performance_By_Hour": by_hour,
+        }
+
+
+def stream_product_kpis(path=ORDER_ITEMS_CSV, chunk_rows: int = CHUNK_ROWS) -> Dict[str, pd.DataFrame]:
+    """Compute the product KPIs of a CSV or XLSX export chunk by chunk, never loading it whole."""
+    aggregates = ProductAggregates()
+    for chunk in iter_order_items(path, chunk_rows):
+        aggregates.update(chunk)
+    return aggregates.results()
+
+
+if __name__ == "__main__":
+    import sys
+
+    export = Path(sys.argv[1]) if len(sys.argv) > 1 else ORDER_ITEMS_CSV
+    for name, table in stream_product_kpis(export).items():
+        print(f"## {name} ({len(table)} rows)")
+        print(table.head(10).to_string(index=False))
@@ -0,0 +1,180 @@
+"""KPI pipeline partitioned by outlet, with the outlets built in parallel.
+
+The order-item export is split by `restaurant_name` into one memory-mappable Arrow partition per
+outlet. Each outlet's product, order and customer analyses run in a process-pool worker that
+writes the outlet's outputs under `results/outlets/<outlet>/` and returns compact partials: the
+product base table, the invoice table, the co-occurrence counts and the customer running totals.
+The all-outlet outputs are then rolled up from those partials, without reading the raw rows again,
+so the pipeline's time grows with the outlets per core rather than with the number of outlets.
+
+The nightly `kpi_refresh.py` keeps only the all-outlet outputs current; the outlet partitions
+are rebuilt in full whenever the pipeline is rerun.
+
+    python outlet_pipeline.py [export.csv] [--workers 4]
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import get_context
+from pathlib import Path
+from scipy import sparse
+from typing import Dict, List, Optional
+
+from associations import PAIRS, rules_from_counts, write_associations
+from co_occurrence import co_occurrence_counts, counts_frame, incidence_matrix, write_co_occurrence
+from customer_clusters import ClusterModel
+from customer_kpis import write_rfm_segments, write_top_items
+from kpi_manifest import manifest_path, refresh_manifest
+from kpi_refresh import CUSTOMERS, INVOICES, CustomerState, invoice_partition, read_output
+from kpi_store import KPI_ROOTS, kpi_output_path, outlet_folder, outlet_slug, write_kpi
+from lapsed_customers import write_targets
+from order_items import ORDER_ITEMS_CSV, load_order_items
+from product_kpis import base_table, product_tables, write_product_kpis
+
+PARTITION_DIR = ORDER_ITEMS_CSV.parent / "outlets"
+OUTLET_WORKERS = int(os.getenv("OUTLET_WORKERS", str(os.cpu_count() or 1)))
+
+
+@dataclass
+class OutletPartials:
+    """What the all-outlet outputs are rolled up from."""
+    base: pd.DataFrame
+    invoices: pd.DataFrame
+    pair_counts: sparse.csr_matrix
+    item_names: pd.Index
+    item_baskets: np.ndarray
+    n_baskets: int
+    customers: CustomerState
+
+
+# --- Partitions ---
+def partition_order_items(items: pd.DataFrame, partition_dir: Path = PARTITION_DIR) -> Dict[str, Path]:
+    """Write every outlet's order items as an uncompressed Arrow file; returns outlet -> path."""
+    partition_dir.mkdir(parents=True, exist_ok=True)
+    partitions = {}
+    for outlet, rows in items.groupby("restaurant_name", observed=True, sort=True):
+        path = partition_dir / f"{outlet_slug(str(outlet))}.arrow"
+        tmp = path.with_suffix(".tmp")
+        feather.write_feather(pa.Table.from_pandas(rows, preserve_index=False), tmp, compression="uncompressed")
+        tmp.replace(path)
+        partitions[str(outlet)] = path
+    return partitions
+
+
+# --- Per-outlet build ---
+def outlet_partials(items: pd.DataFrame) -> OutletPartials:
+    incidence, names = incidence_matrix(items)
+    return OutletPartials(
+        base=base_table(items),
+        invoices=invoice_partition(items),
+        pair_counts=co_occurrence_counts(incidence),
+        item_names=names,
+        item_baskets=np.asarray(incidence.sum(axis=0)).ravel(),
+        n_baskets=incidence.shape[0],
+        customers=CustomerState.from_items(items),
+    )
+
+
+def write_outputs(partials: OutletPartials, root: Optional[Path] = None) -> List[Path]:
+    """Every KPI output from partials, under `root` or, without one, at the all-outlet locations."""
+    written = write_product_kpis(product_tables(partials.base), root)
+
+    invoices = kpi_output_path(INVOICES, root)
+    invoices.parent.mkdir(parents=True, exist_ok=True)
+    write_kpi(partials.invoices, invoices)
+    written.append(invoices)
+    written += write_co_occurrence(counts_frame(partials.pair_counts, partials.item_names), root)
+    written += write_associations(
+        {PAIRS: rules_from_counts(partials.pair_counts, partials.item_baskets, partials.n_baskets, partials.item_names)}, root,
+    )
+
+    # Clusters come from the persisted model; without one, the labels already written are kept
+    path = kpi_output_path(CUSTOMERS, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    existing = read_output(path)
+    clusters = None
+    if existing is not None and "Cluster" in existing.columns:
+        phones = pd.to_numeric(existing["customer_phone"], errors="coerce").round().astype("Int64")
+        clusters = existing.set_axis(phones)["Cluster"]
+    kpis = partials.customers.kpis(clusters)
+    model = ClusterModel.load()
+    if model is not None and len(kpis):
+        kpis["Cluster"] = model.assign(kpis).to_numpy()
+    write_kpi(kpis, path)
+    written += [
+        path,
+        write_rfm_segments(kpis, root=root),
+        write_top_items(partials.customers.item_totals(), root),
+        write_targets(partials.invoices, root),
+    ]
+    return written
+
+
+def build_outlet(outlet: str, partition: Path, kpi_base_folder: str) -> OutletPartials:
+    """Pool worker: one outlet's outputs, written to its partition folder; returns its partials."""
+    items = feather.read_table(partition, memory_map=True).to_pandas()
+    partials = outlet_partials(items)
+    write_outputs(partials, outlet_folder(kpi_base_folder, outlet))
+    return partials
+
+
+# --- Cross-outlet rollup ---
+def combine_partials(partials: List[OutletPartials]) -> OutletPartials:
+    """All-outlet partials: bases and invoices stacked, co-occurrence counts summed over a shared item index.
+
+    Bases and invoices carry their outlet, so orders stay distinct by (restaurant_name, invoice_no).
+    """
+    names = pd.Index(sorted(set().union(*(part.item_names for part in partials))), name="item_name")
+    pair_counts = sparse.csr_matrix((len(names), len(names)), dtype=partials[0].pair_counts.dtype)
+    item_baskets = np.zeros(len(names), dtype=partials[0].item_baskets.dtype)
+    for part in partials:
+        codes = names.get_indexer(part.item_names)
+        counts = part.pair_counts.tocoo()
+        pair_counts = pair_counts + sparse.csr_matrix((counts.data, (codes[counts.row], codes[counts.col])), shape=pair_counts.shape)
+        np.add.at(item_baskets, codes, part.item_baskets)
+
+    return OutletPartials(
+        base=pd.concat([part.base for part in partials], ignore_index=True),
+        invoices=pd.concat([part.invoices for part in partials], ignore_index=True),
+        pair_counts=pair_counts,
+        item_names=names,
+        item_baskets=item_baskets,
+        n_baskets=sum(part.n_baskets for part in partials),
+        customers=CustomerState.combine([part.customers for part in partials]),
+    )
+
+
+def run_pipeline(export: Path = ORDER_ITEMS_CSV, kpi_base_folder: str = KPI_ROOTS[0], workers: int = OUTLET_WORKERS) -> List[str]:
+    """Partition the export, build every outlet in the pool, then roll up; returns the outlets built."""
+    partitions = partition_order_items(load_order_items(export))
+    outlets = list(partitions)
+    if workers > 1 and len(outlets) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(outlets)), mp_context=get_context("spawn")) as pool:
+            futures = [pool.submit(build_outlet, outlet, partitions[outlet], kpi_base_folder) for outlet in outlets]
+            partials = [future.result() for future in futures]
+    else:
+        partials = [build_outlet(outlet, partitions[outlet], kpi_base_folder) for outlet in outlets]
+
+    written = write_outputs(combine_partials(partials))
+    for root in KPI_ROOTS:
+        if manifest_path(root).exists() and any(Path(root).resolve() in path.resolve().parents for path in written):
+            refresh_manifest(root)
+    return outlets
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("export", nargs="?", type=Path, default=ORDER_ITEMS_CSV, help="Order-item export (CSV)")
+    parser.add_argument("--workers", type=int, default=OUTLET_WORKERS)
+    args = parser.parse_args()
+    for outlet in run_pipeline(args.export, workers=args.workers):
+        print(f"🏪 {outlet} -> {outlet_folder(KPI_ROOTS[0], outlet)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Product KPIs at every granularity from a single aggregation pass.
+
+The cleaned order items are grouped once at the finest grain the reports need: order date x
+hour x item x invoice. Every yearly, monthly, daily, weekday and hourly table and pivot of the
+product analysis is then rolled up from that base table, which already holds the sums and
+calendar attributes, so the raw rows are parsed and grouped only once however many reports are
+built. Keeping the invoice in the grain keeps distinct order counts exact at every level.
+
+    python product_kpis.py
+"""
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from kpi_store import kpi_output_path, write_kpi
+from order_items import item_sales, load_order_items
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# An order is an invoice of one outlet; invoice numbers repeat across outlets
+ORDER_KEYS = ["restaurant_name", "invoice_no"]
+
+# Summable measures of the base table
+MEASURES = ["units", "net_sales", "price_sum", "lines"]
+
+# Outputs, relative to a KPI root
+YEARLY_TOP = "product_analysis/yearly/Yearly_Top_Selling_Items.csv"
+YEARLY_PRODUCTS = "product_analysis/yearly/Yearly_Product_Performance.csv"
+MONTHLY_TOP = "product_analysis/monthly/Monthly_Top_Selling_Items.csv"
+MONTHLY_PRODUCTS = "product_analysis/monthly/Monthly_Product_Performance.csv"
+DAILY_PRODUCTS = "product_analysis/daily/Daily_Product_Performance.csv"
+DAILY_PIVOT = "product_analysis/daily/Daily_Item_Sales_Pivot.csv"
+BY_DAY = "product_analysis/daily/Average_Performance_By_DayOfWeek.csv"
+HOURLY_PRODUCTS = "product_analysis/hourly/Hourly_Product_Performance.csv"
+HOURLY_PIVOT = "product_analysis/hourly/Hourly_Item_Sales_Pivot.csv"
+BY_HOUR = "product_analysis/hourly/Average_Performance_By_Hour.csv"
+
+# Pivots are written with their index (the notebook's layout)
+PIVOTS = {DAILY_PIVOT, HOURLY_PIVOT}
+
+
+def base_table(items: pd.DataFrame) -> pd.DataFrame:
+    """The one pass over the order items: sums per order date, hour, item and order (outlet and invoice)."""
+    sales = item_sales(items)
+    base = sales.groupby(
+        [sales["date"].dt.normalize().rename("Order_Date"), sales["date"].dt.hour.rename("Hour"), "item_name", *ORDER_KEYS],
+        observed=True,
+        dropna=False,
+    ).agg(
+        units=("item_quantity", "sum"),
+        net_sales=("net_sales", "sum"),
+        price_sum=("item_price", "sum"),
+        lines=("item_price", "count"),
+    ).reset_index()
+    # Calendar attributes are looked up per distinct date rather than computed per row
+    dates = pd.DatetimeIndex(base["Order_Date"].unique())
+    calendar = pd.DataFrame(
+        {"DayOfWeek": dates.day_name(), "YearMonth": dates.to_period("M"), "Month": dates.strftime("%b")},
+        index=dates,
+    )
+    return base.join(calendar, on="Order_Date")
+
+
+def rollup(base: pd.DataFrame, keys: List[str], orders: bool = True) -> pd.DataFrame:
+    """Sum the base measures up to `keys`, with the distinct invoice count as `orders`."""
+    totals = base.groupby(keys, observed=True)[MEASURES].sum()
+    if orders:
+        # Lines without an invoice number count towards the sums but not the orders, like nunique
+        invoiced = base[keys + ORDER_KEYS].dropna(subset=["invoice_no"]).drop_duplicates()
+        totals["orders"] = invoiced.groupby(keys, observed=True).size().reindex(totals.index, fill_value=0)
+    return totals
+
+
+def performance(totals: pd.DataFrame, orders: bool = True) -> pd.DataFrame:
+    table = pd.DataFrame({
+        "total_units_sold": totals["units"],
+        "total_net_sales": totals["net_sales"],
+        "average_selling_price": totals["price_sum"] / totals["lines"],
+    })
+    if orders:
+        table["orders_count"] = totals["orders"]
+        table["weighted_avg_price"] = table["total_net_sales"] / table["total_units_sold"]
+    return table.reset_index()
+
+
+def averages(totals: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "avg_units_sold": totals["units"] / totals["lines"],
+        "avg_net_sales": totals["net_sales"] / totals["lines"],
+        "avg_orders": totals["orders"],
+    })
+
+
+def build_product_kpis(items: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Every product analysis output, keyed by its path relative to a KPI root."""
+    return product_tables(base_table(items))
+
+
+def product_tables(base: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Every product analysis output from a base table, which may concatenate several outlets' bases."""
+    item_date_hour = rollup(base, ["Order_Date", "Hour", "item_name"])
+    item_date = rollup(base, ["Order_Date", "DayOfWeek", "item_name"])
+    item_month = rollup(base, ["YearMonth", "item_name"], orders=False)
+    items_total = rollup(base, ["item_name"])
+
+    yearly = performance(items_total).sort_values(by="total_units_sold", ascending=False)
+    top_yearly = items_total["units"].rename("item_quantity").reset_index().sort_values(by="item_quantity", ascending=False)
+
+    monthly = performance(item_month, orders=False)
+    monthly["YearMonth"] = monthly["YearMonth"].astype(str)
+    monthly_pivot = rollup(base, ["item_name", "Month"], orders=False)["units"].unstack(fill_value=0)
+    monthly_pivot["Total"] = monthly_pivot.sum(axis=1)
+    monthly_pivot = monthly_pivot.sort_values(by="Total", ascending=False).reset_index()
+
+    daily = performance(item_date)
+    hourly = performance(item_date_hour)
+    for table in (daily, hourly):
+        table["Order_Date"] = table["Order_Date"].dt.strftime("%Y-%m-%d")
+
+    day_item = rollup(base, ["DayOfWeek", "item_name"], orders=False)["units"]
+    hour_item = rollup(base, ["Hour", "item_name"], orders=False)["units"]
+
+    return {
+        YEARLY_TOP: top_yearly,
+        YEARLY_PRODUCTS: yearly,
+        MONTHLY_TOP: monthly_pivot,
+        MONTHLY_PRODUCTS: monthly,
+        DAILY_PRODUCTS: daily,
+        DAILY_PIVOT: day_item.unstack(fill_value=0).reindex(WEEKDAYS),
+        BY_DAY: averages(rollup(base, ["DayOfWeek"])).reindex(WEEKDAYS).rename_axis("DayOfWeek").reset_index(),
+        HOURLY_PRODUCTS: hourly,
+        HOURLY_PIVOT: hour_item.unstack(fill_value=0),
+        BY_HOUR: averages(rollup(base, ["Hour"])).reset_index(),
+    }
+
+
+def write_product_kpis(tables: Dict[str, pd.DataFrame], root: Optional[Path] = None) -> List[Path]:
+    written = []
+    for rel_path, table in tables.items():
+        path = kpi_output_path(rel_path, root)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_kpi(table, path, index=rel_path in PIVOTS)
+        written.append(path)
+    return written
+
+
+if __name__ == "__main__":
+    for path in write_product_kpis(build_product_kpis(load_order_items())):
+        print(f"📦 {path}")
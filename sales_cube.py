@@ -0,0 +1,203 @@
+"""Item x date x hour sales cube, so drill-downs are array slices instead of DataFrame scans.
+
+Units, net sales and orders from the hourly product performance are held in one dense
+(measure, item, date, hour) float64 array. Items and dates are dictionary-encoded: the axes store
+each distinct item name and order date once, and weekday and month codes are precomputed per
+date, so a rollup by weekday or month is a sum over a slice followed by a bincount.
+
+The cube is saved next to the hourly CSV as `<name>.cube.npy` (memory-mapped when loaded) with
+its axes in `<name>.cube.json`, and rebuilt whenever the CSV is newer:
+
+    python sales_cube.py [--by weekday] [--items shake] [--hours afternoon]
+"""
+import argparse
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Optional, Sequence, Tuple
+
+from kpi_store import KPI_ROOTS, locate_kpi_file, read_kpi_table
+from product_kpis import HOURLY_PRODUCTS, WEEKDAYS
+
+MEASURES = ["units", "net_sales", "orders"]
+# Hourly CSV column of every measure; orders are the invoices holding the item
+SOURCE_COLUMNS = {"units": "total_units_sold", "net_sales": "total_net_sales", "orders": "orders_count"}
+HOURS = 24
+
+DAY_GROUPS = {"weekday": WEEKDAYS[:5], "weekend": WEEKDAYS[5:]}
+HOUR_BANDS = {
+    "morning": range(6, 12),
+    "afternoon": range(12, 17),
+    "evening": range(17, 21),
+    "night": [21, 22, 23, 0, 1, 2, 3, 4, 5],
+}
+GROUPINGS = ["item", "date", "weekday", "hour", "month", "total"]
+
+
+def cube_paths(csv_path: Path) -> Tuple[Path, Path]:
+    """Array and axes file of the cube built from `csv_path`."""
+    stem = Path(csv_path).with_suffix("")
+    return stem.with_name(stem.name + ".cube.npy"), stem.with_name(stem.name + ".cube.json")
+
+
+class SalesCube:
+    """Dense sales cube with its item and date axes."""
+
+    def __init__(self, items: pd.Index, dates: pd.DatetimeIndex, values: np.ndarray):
+        self.items = items
+        self.dates = dates
+        self.values = values
+        self.weekday_codes = dates.dayofweek.to_numpy()
+        periods = dates.to_period("M")
+        self.months = periods.unique().sort_values()
+        self.month_codes = self.months.get_indexer(periods)
+
+    @classmethod
+    def from_hourly(cls, hourly: pd.DataFrame) -> "SalesCube":
+        """Scatter the (date, hour, item) rows of the hourly product performance into the cube."""
+        item_codes, items = pd.factorize(hourly["item_name"].astype(str), sort=True)
+        date_codes, dates = pd.factorize(pd.to_datetime(hourly["Order_Date"]).dt.normalize(), sort=True)
+        values = np.zeros((len(MEASURES), len(items), len(dates), HOURS))
+        hours = hourly["Hour"].to_numpy(dtype="int64")
+        for m, measure in enumerate(MEASURES):
+            np.add.at(values[m], (item_codes, date_codes, hours), hourly[SOURCE_COLUMNS[measure]].to_numpy(dtype="float64"))
+        return cls(pd.Index(items, name="item_name"), pd.DatetimeIndex(dates, name="Order_Date"), values)
+
+    # --- Persistence ---
+    def save(self, csv_path: Path) -> None:
+        array_path, axes_path = cube_paths(csv_path)
+        tmp = array_path.with_name(array_path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, self.values)
+        tmp.replace(array_path)
+        axes_path.write_text(json.dumps({
+            "measures": MEASURES,
+            "items": self.items.tolist(),
+            "dates": self.dates.strftime("%Y-%m-%d").tolist(),
+        }))
+
+    @classmethod
+    def load(cls, csv_path: Path) -> Optional["SalesCube"]:
+        """The saved cube, memory-mapped; None if it is missing, outdated or older than the CSV."""
+        array_path, axes_path = cube_paths(csv_path)
+        if not array_path.exists() or not axes_path.exists():
+            return None
+        if Path(csv_path).exists() and array_path.stat().st_mtime < Path(csv_path).stat().st_mtime:
+            return None
+        axes = json.loads(axes_path.read_text())
+        if axes.get("measures") != MEASURES:
+            return None
+        values = np.load(array_path, mmap_mode="r")
+        return cls(pd.Index(axes["items"], name="item_name"), pd.DatetimeIndex(axes["dates"], name="Order_Date"), values)
+
+    # --- Selection ---
+    def item_indices(self, items: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Items whose name contains any of `items` (case-insensitive); all items without a filter."""
+        if not items:
+            return np.arange(len(self.items))
+        names = self.items.str.lower()
+        selected = np.zeros(len(self.items), dtype=bool)
+        for item in items:
+            matches = names.str.contains(item.strip().lower(), regex=False)
+            if not matches.any():
+                raise ValueError(f"Unknown item '{item}'")
+            selected |= matches
+        return np.flatnonzero(selected)
+
+    def date_indices(self, weekdays: Optional[Sequence[str]] = None, months: Optional[Sequence[str]] = None,
+                     date_from: Optional[str] = None, date_to: Optional[str] = None) -> np.ndarray:
+        """Dates on the given weekdays ('Monday', 'weekend', ...), in the given months ('2024-06') and range."""
+        selected = np.ones(len(self.dates), dtype=bool)
+        if weekdays:
+            days = set()
+            for day in weekdays:
+                label = day.strip().lower()
+                group = DAY_GROUPS.get(label) or [d for d in WEEKDAYS if d.lower().startswith(label[:3])]
+                if not group:
+                    raise ValueError(f"Unknown weekday '{day}'; use a day name, 'weekday' or 'weekend'")
+                days.update(WEEKDAYS.index(d) for d in group)
+            selected &= np.isin(self.weekday_codes, sorted(days))
+        if months:
+            codes = self.months.get_indexer(pd.PeriodIndex(months, freq="M"))
+            selected &= np.isin(self.month_codes, codes[codes >= 0])
+        if date_from:
+            selected &= self.dates >= pd.Timestamp(date_from)
+        if date_to:
+            selected &= self.dates <= pd.Timestamp(date_to)
+        return np.flatnonzero(selected)
+
+    @staticmethod
+    def hour_indices(hours: Optional[Sequence] = None) -> np.ndarray:
+        """Hours given as numbers or bands ('afternoon'); all hours without a filter."""
+        if not hours:
+            return np.arange(HOURS)
+        selected = set()
+        for hour in hours:
+            band = HOUR_BANDS.get(str(hour).strip().lower())
+            if band is None and not (str(hour).strip().isdigit() and int(hour) < HOURS):
+                raise ValueError(f"Unknown hour '{hour}'; use 0-23 or one of {list(HOUR_BANDS)}")
+            selected.update(band if band is not None else [int(hour)])
+        return np.array(sorted(selected))
+
+    # --- Rollups ---
+    def rollup(self, by: str = "item", items: Optional[Sequence[str]] = None, weekdays: Optional[Sequence[str]] = None,
+               hours: Optional[Sequence] = None, months: Optional[Sequence[str]] = None,
+               date_from: Optional[str] = None, date_to: Optional[str] = None) -> pd.DataFrame:
+        """Measures of the selected slice summed up to `by`: item, date, weekday, hour, month or total.
+
+        Orders count the invoices holding an item, so over several items an invoice counts once per item.
+        """
+        if by not in GROUPINGS:
+            raise ValueError(f"Unknown grouping '{by}'; use one of {GROUPINGS}")
+        i, d, h = self.item_indices(items), self.date_indices(weekdays, months, date_from, date_to), self.hour_indices(hours)
+        block = self.values[np.ix_(np.arange(len(MEASURES)), i, d, h)]
+
+        if by == "item":
+            sums, index = block.sum(axis=(2, 3)), self.items[i]
+        elif by == "hour":
+            sums, index = block.sum(axis=(1, 2)), pd.Index(h, name="Hour")
+        elif by == "total":
+            sums, index = block.sum(axis=(1, 2, 3))[:, None], pd.Index(["total"])
+        else:
+            per_date = block.sum(axis=(1, 3))
+            if by == "date":
+                sums, index = per_date, self.dates[d]
+            else:
+                codes, labels = (
+                    (self.weekday_codes[d], pd.Index(WEEKDAYS, name="DayOfWeek")) if by == "weekday"
+                    else (self.month_codes[d], self.months.rename("YearMonth"))
+                )
+                sums = np.stack([np.bincount(codes, weights=row, minlength=len(labels)) for row in per_date])
+                present = np.isin(np.arange(len(labels)), codes)
+                sums, index = sums[:, present], labels[present]
+        table = pd.DataFrame(sums.T, index=index, columns=MEASURES)
+        return table.astype({"units": "int64", "orders": "int64"}).assign(net_sales=table["net_sales"].round(2))
+
+
+def load_sales_cube(csv_path: Path) -> SalesCube:
+    """The cube of `csv_path`, rebuilt and saved first when it is missing or stale."""
+    cube = SalesCube.load(csv_path)
+    if cube is None:
+        SalesCube.from_hourly(read_kpi_table(csv_path)).save(csv_path)
+        cube = SalesCube.load(csv_path)
+    return cube
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--by", choices=GROUPINGS, default="item")
+    parser.add_argument("--items", nargs="*")
+    parser.add_argument("--weekdays", nargs="*")
+    parser.add_argument("--hours", nargs="*")
+    parser.add_argument("--months", nargs="*")
+    args = parser.parse_args()
+    path = locate_kpi_file(KPI_ROOTS[0], HOURLY_PRODUCTS)
+    if path is None:
+        parser.error(f"{HOURLY_PRODUCTS} not found; run the product notebook first")
+    table = load_sales_cube(path).rollup(args.by, args.items, args.weekdays, args.hours, args.months)
+    print(table.sort_values("net_sales", ascending=False).head(20).to_string() if args.by == "item" else table.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,6 @@ import asyncio
 import json
 from datetime import datetime
 from typing import List, Any
-from dataclasses import dataclass
 
 # Import Rich components for enhanced UI
 from rich.console import Console
@@ -28,7 +27,9 @@ from pydantic_ai.messages import (
 )
 from pydantic import BaseModel
 # Assuming these tools exist in a 'tools.py' file
-from tools import explore_kpi_structure, load_kpi_file
+from tools import Deps, explore_kpi_structure, load_kpi_file
+from kpi_cache import kpi_cache
+from agent_service import partial_output, STREAM_DEBOUNCE
 # Assuming a 'settings.py' file with an OpenAI API key
 from settings import Settings
 
@@ -47,10 +48,6 @@ chat_model = OpenAIModel(
     provider=OpenAIProvider(api_key=settings.openai_api_key)
 )
 
-@dataclass
-class Deps:
-    kpi_base_folder: str
-
 try:
     with open("prompts/creative_coupon.txt", "r", encoding="utf-8") as f:
         prompt = f.read()
@@ -100,6 +97,8 @@ def create_stats_panel(stats: ChatStats) -> Panel:
     table.add_row("⏱️ Time", f"{session_time.seconds // 60}m {session_time.seconds % 60}s")
     # FIX: Using the dynamic model name variable instead of a hardcoded string.
     table.add_row("🤖 Model", chat_model_name)
+    cache_stats = kpi_cache.stats()
+    table.add_row("🗄️ KPI Cache", f"{cache_stats['hits']} hits / {cache_stats['misses']} misses")
     
     return Panel(
         table,
@@ -174,6 +173,14 @@ async def process_tool_calls(console: Console, result: Any):
                         subtitle=f"from {part.tool_name}"
                     ))
 
+def format_partial(partial: Any) -> str:
+    """Markdown for a partial output: plain text, or the structured fields filled in so far."""
+    if isinstance(partial, str):
+        return partial
+    return "\n\n".join(
+        f"**{field.replace('_', ' ').title()}**\n\n{value}" for field, value in partial.items() if value
+    )
+
 async def stream_response(console: Console, result: Any) -> str:
     """Stream the AI response with enhanced formatting."""
     response_text = ""
@@ -184,8 +191,8 @@ async def stream_response(console: Console, result: Any) -> str:
         )
         live.update(response_panel)
         
-        async for message_chunk in result.stream():
-            response_text = message_chunk
+        async for message, _ in result.stream_structured(debounce_by=STREAM_DEBOUNCE):
+            response_text = format_partial(partial_output(message))
             content = Markdown(response_text, style="bright_white") if len(response_text) > 3 else Text(response_text)
             response_panel = Panel(
                 content, title="🤖 Assistant", border_style="bright_magenta", padding=(1, 2)
@@ -1,15 +1,118 @@
+import asyncio
+import functools
+import hashlib
+import os
+import threading
+import time
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from pydantic_ai import RunContext  # Assuming you're using this in the broader context
-from typing import Dict
+from typing import Any, Callable, Dict, List, Optional
 from dataclasses import dataclass
+from kpi_store import read_kpi_table, read_schema, count_rows, columnar_path, locate_kpi_file, outlet_folder
+from kpi_cache import kpi_cache, file_fingerprint, files_fingerprint, tree_fingerprint
+from kpi_manifest import current_manifest, load_manifest, is_entry_current
+from kpi_query import KPIQuery, required_columns, validate, run_query
+from kpi_render import TOOL_TOKEN_BUDGET, format_kpi_summary, render_kpi_summary, with_token_footer, count_tokens
+from associations import PAIRS, TRIPLES, AssociationIndex
+from lapsed_customers import INVOICES, lapsed_customers, summarize_targets
+from coupon_simulator import CUSTOMERS, SCENARIOS, CouponSpec, simulate
+from product_kpis import HOURLY_PRODUCTS
+from sales_cube import SalesCube, load_sales_cube
+from customer_store import STORE_FILES, CustomerStore, load_customer_store
 
 @dataclass
 class Deps:
     kpi_base_folder: str = "./results"
+    outlet: Optional[str] = None  # one outlet's KPI partition; None for all outlets
 
-async def explore_kpi_structure(ctx: RunContext[Deps]) -> str:
-    base_path = Path(ctx.deps.kpi_base_folder)
+    @property
+    def kpi_folder(self) -> str:
+        return str(outlet_folder(self.kpi_base_folder, self.outlet))
+
+# File reads and summaries run here, off the event loop. Threads rather than processes so every
+# call shares the process-wide KPI cache; pandas and pyarrow release the GIL for most of the parsing.
+TOOL_WORKERS = int(os.getenv("KPI_TOOL_WORKERS", "4"))
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="kpi-tool")
+
+async def run_blocking(func: Callable[..., Any], *args: Any) -> Any:
+    return await asyncio.get_running_loop().run_in_executor(tool_executor, functools.partial(func, *args))
+
+class ToolTimings:
+    """Call count and wall time per agent tool, across every agent in the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def record(self, tool_name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self._timings.setdefault(tool_name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            timing["calls"] += 1
+            timing["total_ms"] += seconds * 1000
+            timing["max_ms"] = max(timing["max_ms"], seconds * 1000)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: dict(timing) for name, timing in self._timings.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._timings.clear()
+
+tool_timings = ToolTimings()
+
+def timed_tool(func: Callable) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            tool_timings.record(func.__name__, time.perf_counter() - start)
+    return wrapper
+
+def kpi_fingerprint(filepath: Path) -> tuple:
+    arrow_path = columnar_path(filepath)
+    arrow_fp = file_fingerprint(arrow_path) if arrow_path.exists() else None
+    return file_fingerprint(filepath) + (arrow_fp,)
+
+# KPI files read by the dedicated tools; the generic ones read what the manifest lists
+TOOL_FILES = [PAIRS, TRIPLES, HOURLY_PRODUCTS, INVOICES, CUSTOMERS, *STORE_FILES]
+
+def kpi_data_fingerprint(kpi_base_folder: str, extra_files: List[str] = ()) -> str:
+    """Hash of the KPI data the tools can answer from: the files of the dedicated tools and
+    `extra_files` where `locate_kpi_file` finds them, and the manifest entries of the folder."""
+    rel_paths = sorted(set(TOOL_FILES) | set(extra_files))
+    paths = [locate_kpi_file(kpi_base_folder, rel) or Path(kpi_base_folder) / rel for rel in rel_paths]
+    manifest = load_manifest(kpi_base_folder)
+    if manifest is None:
+        paths += sorted(Path(kpi_base_folder).rglob("*.csv"))
+        listed = ""
+    else:
+        listed = "\n".join(f"{rel}:{entry['sha1']}" for rel, entry in sorted(manifest["files"].items()))
+    return hashlib.sha1((files_fingerprint(paths) + listed).encode()).hexdigest()
+
+def manifest_structure(manifest: Dict) -> Dict:
+    root = {"folders": [], "files": []}
+    for entry in manifest["files"].values():
+        node = root
+        for part in entry["path"].split("/")[:-1]:
+            folder = next((f for f in node["folders"] if f["name"] == part), None)
+            if folder is None:
+                folder = {"name": part, "content": {"folders": [], "files": []}}
+                node["folders"].append(folder)
+            node = folder["content"]
+        node["files"].append(f"{entry['filename']} ({entry['rows']} rows × {len(entry['columns'])} cols)")
+    return root
+
+def load_kpi_table(filepath: Path, columns: List[str] = None) -> pd.DataFrame:
+    key = ("table", str(filepath.resolve()), tuple(columns) if columns else None)
+    return kpi_cache.get_or_load(key, kpi_fingerprint(filepath), lambda: read_kpi_table(filepath, columns=columns))
+
+def describe_kpi_structure(kpi_base_folder: str) -> str:
+    base_path = Path(kpi_base_folder)
 
     if not base_path.exists():
         return "KPI base folder not found"
@@ -29,8 +132,6 @@ async def explore_kpi_structure(ctx: RunContext[Deps]) -> str:
             pass
         return result
 
-    structure = scan_directory(base_path)
-
     def format_structure(struct: Dict, level: int = 0) -> str:
         output = []
         indent = "  " * level
@@ -41,12 +142,41 @@ async def explore_kpi_structure(ctx: RunContext[Deps]) -> str:
             output.append(f"{indent}📄 {file}")
         return "\n".join(output)
 
-    return f"KPI Folder Structure:\n{format_structure(structure)}"
+    manifest = current_manifest(base_path)
+    if manifest is not None:
+        return f"KPI Folder Structure:\n{format_structure(manifest_structure(manifest))}"
 
-async def list_kpi_files_by_category(ctx: RunContext[Deps], category: str, subcategory: str = None) -> str:
-    base_path = Path(ctx.deps.kpi_base_folder)
+    def render() -> str:
+        structure = scan_directory(base_path)
+        return f"KPI Folder Structure:\n{format_structure(structure)}"
+
+    key = ("structure", str(base_path.resolve()))
+    return kpi_cache.get_or_load(key, tree_fingerprint(base_path), render)
+
+@timed_tool
+async def explore_kpi_structure(ctx: RunContext[Deps]) -> str:
+    return await run_blocking(describe_kpi_structure, ctx.deps.kpi_folder)
+
+def list_kpi_files(kpi_base_folder: str, category: str, subcategory: str = None) -> str:
+    base_path = Path(kpi_base_folder)
     target_path = base_path / category / subcategory if subcategory else base_path / category
 
+    manifest = current_manifest(base_path)
+    if manifest is not None:
+        entries = [
+            e for e in manifest["files"].values()
+            if e["category"] == category and (e["subcategory"] or None) == (subcategory or None)
+        ]
+        if not entries:
+            return f"No CSV files found in {target_path}"
+        file_info = [
+            f"  📄 {e['filename']} ({e['size_bytes'] / (1024 * 1024):.2f} MB, {e['rows']} rows"
+            + (f", {e['date_range']['min']} → {e['date_range']['max']}" if e["date_range"] else "")
+            + ")"
+            for e in entries
+        ]
+        return f"Files in {category}" + (f"/{subcategory}" if subcategory else "") + f":\n" + "\n".join(file_info)
+
     if not target_path.exists():
         return f"Path {target_path} not found"
 
@@ -66,28 +196,328 @@ async def list_kpi_files_by_category(ctx: RunContext[Deps], category: str, subca
 
     return f"Files in {category}" + (f"/{subcategory}" if subcategory else "") + f":\n" + "\n".join(file_info)
 
-async def load_kpi_file(ctx: RunContext[Deps], category: str, filename: str, subcategory: str = None) -> str:
-    base_path = Path(ctx.deps.kpi_base_folder)
+@timed_tool
+async def list_kpi_files_by_category(ctx: RunContext[Deps], category: str, subcategory: str = None) -> str:
+    return await run_blocking(list_kpi_files, ctx.deps.kpi_folder, category, subcategory)
+
+def summarize_kpi_file(kpi_base_folder: str, category: str, filename: str, subcategory: str = None, columns: List[str] = None) -> str:
+    base_path = Path(kpi_base_folder)
     filepath = base_path / category / subcategory / filename if subcategory else base_path / category / filename
 
     if not filepath.exists():
         return f"File not found: {filepath}"
 
+    label = f"{category}{'/' + subcategory if subcategory else ''}/{filename}"
+    manifest = load_manifest(base_path)
+    entry = manifest["files"].get(filepath.relative_to(base_path).as_posix()) if manifest else None
+    if entry is not None and not columns and is_entry_current(entry, filepath):
+        summary = format_kpi_summary(label, entry["rows"], entry["columns"], entry["head"], entry["describe"])
+        if count_tokens(summary) <= TOOL_TOKEN_BUDGET:
+            return with_token_footer(summary, TOOL_TOKEN_BUDGET)
+
+    def render() -> str:
+        schema = read_schema(filepath)
+        if schema is not None and columns:
+            missing = [c for c in columns if c not in schema.names]
+            if missing:
+                return f"Unknown columns: {', '.join(missing)}. Available: {', '.join(schema.names)}"
+
+        df = load_kpi_table(filepath, columns=columns or None)
+        all_columns = schema.names if schema is not None else df.columns.tolist()
+        n_rows = count_rows(filepath) if schema is not None else df.shape[0]
+        return render_kpi_summary(label, df, n_rows, all_columns, TOOL_TOKEN_BUDGET)
+
     try:
-        df = pd.read_csv(filepath)
-        summary = f"""
-📊 KPI File Analysis
-Path: {category}{'/' + subcategory if subcategory else ''}/{filename}
-Shape: {df.shape[0]} rows, {df.shape[1]} columns
-Columns: {', '.join(df.columns.tolist())}
-
-📋 First 5 rows:
-{df.head().to_string()}
-
-📈 Basic Statistics:
-{df.describe().to_string()}
-        """
-        return summary
+        key = ("summary", str(filepath.resolve()), tuple(columns) if columns else None)
+        return kpi_cache.get_or_load(key, kpi_fingerprint(filepath), render)
     except Exception as e:
         return f"Error loading file: {str(e)}"
 
+@timed_tool
+async def load_kpi_file(ctx: RunContext[Deps], category: str, filename: str, subcategory: str = None, columns: List[str] = None) -> str:
+    return await run_blocking(summarize_kpi_file, ctx.deps.kpi_folder, category, filename, subcategory, columns)
+
+def query_kpi_file(kpi_base_folder: str, category: str, filename: str, subcategory: str, query: KPIQuery) -> str:
+    base_path = Path(kpi_base_folder)
+    filepath = base_path / category / subcategory / filename if subcategory else base_path / category / filename
+
+    if not filepath.exists():
+        return f"File not found: {filepath}"
+
+    try:
+        schema = read_schema(filepath)
+        names = schema.names if schema is not None else pd.read_csv(filepath, nrows=0).columns.tolist()
+        error = validate(query, names)
+        if error:
+            return error
+
+        df = load_kpi_table(filepath, columns=required_columns(query, names))
+        result = run_query(df, query)
+        label = f"{category}{'/' + subcategory if subcategory else ''}/{filename}"
+        return with_token_footer(
+            f"🔎 Query on {label}: {len(result)} result rows (showing {min(len(result), query.limit)})\n\n"
+            f"{result.head(query.limit).to_string(index=False)}",
+            TOOL_TOKEN_BUDGET,
+        )
+    except Exception as e:
+        return f"Error querying file: {str(e)}"
+
+@timed_tool
+async def query_kpi_table(
+    ctx: RunContext[Deps],
+    category: str,
+    filename: str,
+    subcategory: str = None,
+    columns: List[str] = None,
+    date_from: str = None,
+    date_to: str = None,
+    items: List[str] = None,
+    days_of_week: List[str] = None,
+    hour_from: int = None,
+    hour_to: int = None,
+    clusters: List[int] = None,
+    group_by: List[str] = None,
+    aggregate: str = "sum",
+    sort_by: str = None,
+    descending: bool = True,
+    limit: int = 20,
+) -> str:
+    """Filter, project and aggregate one KPI table and return only the matching rows.
+
+    Args:
+        category: KPI folder, e.g. 'product_analysis'.
+        filename: CSV file name, e.g. 'Hourly_Product_Performance.csv'.
+        subcategory: Optional sub folder, e.g. 'hourly'.
+        columns: Columns to return; all columns when omitted.
+        date_from: First date to include (YYYY-MM-DD).
+        date_to: Last date to include (YYYY-MM-DD).
+        items: Item names to keep (case-insensitive exact match).
+        days_of_week: Weekday names to keep, e.g. ['Saturday', 'Sunday'].
+        hour_from: First hour of day to include (0-23).
+        hour_to: Last hour of day to include (0-23).
+        clusters: Customer cluster ids to keep.
+        group_by: Columns to group by; 'DayOfWeek' and 'Hour' can be derived from a timestamp.
+        aggregate: Aggregation for grouped numeric columns: sum, mean, median, min, max or count. With sum or mean, prices and averages are recomputed as weighted averages (e.g. net sales / units) or left out.
+        sort_by: Column to sort the result by; defaults to the first metric when grouping.
+        descending: Sort order.
+        limit: Maximum number of rows to return.
+    """
+    query = KPIQuery(
+        columns=columns, date_from=date_from, date_to=date_to, items=items,
+        days_of_week=days_of_week, hour_from=hour_from, hour_to=hour_to, clusters=clusters,
+        group_by=group_by, aggregate=aggregate, sort_by=sort_by, descending=descending, limit=limit,
+    )
+    return await run_blocking(query_kpi_file, ctx.deps.kpi_folder, category, filename, subcategory, query)
+
+def association_index(kpi_base_folder: str, rel_path: str) -> AssociationIndex:
+    filepath = locate_kpi_file(kpi_base_folder, rel_path)
+    if filepath is None:
+        raise FileNotFoundError(f"{rel_path} not found; build it with `python associations.py`")
+    key = ("associations", str(filepath.resolve()))
+    return kpi_cache.get_or_load(key, kpi_fingerprint(filepath), lambda: AssociationIndex(load_kpi_table(filepath)))
+
+def item_associations(kpi_base_folder: str, item: str, k: int = 5, with_item: str = None) -> str:
+    try:
+        pairs = association_index(kpi_base_folder, PAIRS)
+        name = pairs.resolve(item)
+        if name is None:
+            return f"No association rules for '{item}'; it is unknown or never bought with another item often enough."
+        if with_item is None:
+            rules, label = pairs.top(name, k=k), name
+        else:
+            other = pairs.resolve(with_item)
+            if other is None:
+                return f"No association rules for '{with_item}'; it is unknown or never bought with another item often enough."
+            rules, label = association_index(kpi_base_folder, TRIPLES).top(*sorted([name, other]), k=k), f"{name} + {other}"
+        if rules.empty:
+            return f"No partners of {label} reach the minimum support."
+        return with_token_footer(
+            f"🛒 Top {len(rules)} partners of {label} (by confidence)\n\n"
+            f"{rules[['partner', 'baskets', 'support', 'confidence', 'lift']].to_string(index=False)}",
+            TOOL_TOKEN_BUDGET,
+        )
+    except Exception as e:
+        return f"Error loading associations: {str(e)}"
+
+@timed_tool
+async def get_item_associations(ctx: RunContext[Deps], item: str, k: int = 5, with_item: str = None) -> str:
+    """Items most often bought together with an item, for bundle and cross-sell coupons.
+
+    Args:
+        item: Item name (case-insensitive; a unique part of the name also works).
+        k: Number of partners to return.
+        with_item: Optional second item; returns the best third items for baskets holding both.
+    """
+    return await run_blocking(item_associations, ctx.deps.kpi_folder, item, k, with_item)
+
+def sales_cube(kpi_base_folder: str) -> SalesCube:
+    filepath = locate_kpi_file(kpi_base_folder, HOURLY_PRODUCTS)
+    if filepath is None:
+        raise FileNotFoundError(f"{HOURLY_PRODUCTS} not found")
+    return kpi_cache.get_or_load(("sales_cube", str(filepath.resolve())), kpi_fingerprint(filepath), lambda: load_sales_cube(filepath))
+
+def sales_slice(kpi_base_folder: str, by: str = "item", items: List[str] = None, weekdays: List[str] = None,
+                hours: List[str] = None, months: List[str] = None, date_from: str = None, date_to: str = None,
+                sort_by: str = None, limit: int = 15) -> str:
+    try:
+        table = sales_cube(kpi_base_folder).rollup(by, items, weekdays, hours, months, date_from, date_to)
+        if sort_by or by == "item":
+            table = table.sort_values(sort_by or "net_sales", ascending=False)
+        filters = ", ".join(
+            f"{name}={values}" for name, values in
+            [("items", items), ("weekdays", weekdays), ("hours", hours), ("months", months), ("from", date_from), ("to", date_to)]
+            if values
+        )
+        return with_token_footer(
+            f"📦 Sales by {by} ({filters or 'all sales'}): {len(table)} rows, showing {min(limit, len(table))}\n\n"
+            f"{table.head(limit).to_string()}",
+            TOOL_TOKEN_BUDGET,
+        )
+    except Exception as e:
+        return f"Error slicing sales: {str(e)}"
+
+@timed_tool
+async def slice_sales(
+    ctx: RunContext[Deps],
+    by: str = "item",
+    items: List[str] = None,
+    weekdays: List[str] = None,
+    hours: List[str] = None,
+    months: List[str] = None,
+    date_from: str = None,
+    date_to: str = None,
+    sort_by: str = None,
+    limit: int = 15,
+) -> str:
+    """Units, net sales and orders of any item/day/hour slice, e.g. which items sell on weekday afternoons.
+
+    Args:
+        by: Rollup level: 'item', 'date', 'weekday', 'hour', 'month' or 'total'.
+        items: Item names or parts of names (case-insensitive, e.g. ['shake']); all items if omitted.
+        weekdays: Day names, 'weekday' or 'weekend'.
+        hours: Hours 0-23 or bands: 'morning' (6-11), 'afternoon' (12-16), 'evening' (17-20), 'night' (21-5).
+        months: Months as YYYY-MM.
+        date_from: First order date (YYYY-MM-DD).
+        date_to: Last order date (YYYY-MM-DD).
+        sort_by: 'units', 'net_sales' or 'orders'; items are sorted by net sales by default.
+        limit: Maximum number of rows to return.
+    """
+    return await run_blocking(sales_slice, ctx.deps.kpi_folder, by, items, weekdays, hours, months, date_from, date_to, sort_by, limit)
+
+def lapsed_customer_summary(kpi_base_folder: str, top_n: int = 10) -> str:
+    filepath = locate_kpi_file(kpi_base_folder, INVOICES)
+    if filepath is None:
+        return f"File not found: {INVOICES}"
+    try:
+        columns = ["customer_phone", "customer_name", "order_date_only", "net_invoice_value"]
+        key = ("lapsed", str(filepath.resolve()))
+        customers = kpi_cache.get_or_load(key, kpi_fingerprint(filepath), lambda: lapsed_customers(load_kpi_table(filepath, columns=columns)))
+        return with_token_footer(summarize_targets(customers, top_n), TOOL_TOKEN_BUDGET)
+    except Exception as e:
+        return f"Error analysing lapsed customers: {str(e)}"
+
+@timed_tool
+async def summarize_lapsed_customers(ctx: RunContext[Deps], top_n: int = 10) -> str:
+    """Customers overdue for a visit relative to their own visit cadence, for miss-you coupons.
+
+    Returns how many customers are lapsed, their typical gaps between visits, how far overdue they
+    are, the spend at stake and the most valuable lapsed customers.
+
+    Args:
+        top_n: Number of lapsed customers to list, highest spend first.
+    """
+    return await run_blocking(lapsed_customer_summary, ctx.deps.kpi_folder, top_n)
+
+# Upper bound on scenarios per tool call, to keep a call within a few seconds
+MAX_TOOL_SCENARIOS = 20000
+
+def coupon_simulation(kpi_base_folder: str, spec: CouponSpec, scenarios: int = SCENARIOS) -> str:
+    filepath = locate_kpi_file(kpi_base_folder, CUSTOMERS)
+    if filepath is None:
+        return f"File not found: {CUSTOMERS}"
+    try:
+        scenarios = max(100, min(scenarios, MAX_TOOL_SCENARIOS))
+        key = ("coupon_simulation", str(filepath.resolve()), spec.key(), scenarios)
+        return kpi_cache.get_or_load(
+            key, kpi_fingerprint(filepath),
+            lambda: with_token_footer(simulate(load_kpi_table(filepath), spec, scenarios).describe(), TOOL_TOKEN_BUDGET),
+        )
+    except Exception as e:
+        return f"Error simulating coupon: {str(e)}"
+
+@timed_tool
+async def simulate_coupon(
+    ctx: RunContext[Deps],
+    discount_pct: float,
+    min_order: float = 0.0,
+    stamp_threshold: int = 1,
+    validity_days: int = 30,
+    segment: str = "all",
+    scenarios: int = SCENARIOS,
+) -> str:
+    """Simulate a coupon over the customer base: discount spend, incremental revenue, redemptions and extra visits.
+
+    Use these numbers for every cost analysis instead of estimating them. Returns mean, p5, p50 and
+    p95 over the simulated scenarios.
+
+    Args:
+        discount_pct: Discount in percent of the order value.
+        min_order: Minimum order value for the discount to apply.
+        stamp_threshold: Visits needed within the validity window before the discount applies (1 = plain coupon).
+        validity_days: Days the coupon stays valid.
+        segment: 'all', an RFM segment ('Champions', 'Loyal', 'Potential', 'At Risk') or 'cluster N'.
+        scenarios: Number of Monte Carlo scenarios.
+    """
+    spec = CouponSpec(discount_pct, min_order, stamp_threshold, validity_days, segment)
+    return await run_blocking(coupon_simulation, ctx.deps.kpi_folder, spec, scenarios)
+
+# Customers a single list_customers call returns at most
+MAX_LISTED_CUSTOMERS = 100
+
+def customer_store(kpi_base_folder: str) -> CustomerStore:
+    paths = [locate_kpi_file(kpi_base_folder, rel_path) for rel_path in STORE_FILES]
+    fingerprint = tuple(kpi_fingerprint(path) if path else None for path in paths)
+    key = ("customer_store", str(Path(kpi_base_folder).resolve()))
+    return kpi_cache.get_or_load(key, fingerprint, lambda: load_customer_store(kpi_base_folder))
+
+def customer_profile(kpi_base_folder: str, phone: str) -> str:
+    try:
+        record = customer_store(kpi_base_folder).get(phone)
+        if record is None:
+            return f"No known customer with phone {phone}."
+        return with_token_footer(record.describe(), TOOL_TOKEN_BUDGET)
+    except Exception as e:
+        return f"Error loading customer profile: {str(e)}"
+
+@timed_tool
+async def get_customer_profile(ctx: RunContext[Deps], phone: str) -> str:
+    """One customer's profile: KPIs, RFM segment, cluster, top items and last visits.
+
+    Args:
+        phone: Customer phone number; formatting such as '+91', spaces or a trailing '.0' is ignored.
+    """
+    return await run_blocking(customer_profile, ctx.deps.kpi_folder, phone)
+
+def customer_listing(kpi_base_folder: str, segment: str = "all", limit: int = 20, sort_by: str = "clv") -> str:
+    try:
+        size, records = customer_store(kpi_base_folder).list(segment, min(limit, MAX_LISTED_CUSTOMERS), sort_by)
+        if not records:
+            return f"No customers in segment '{segment}'."
+        table = pd.DataFrame([record.summary_row() for record in records])
+        return with_token_footer(
+            f"👥 {size} customers in '{segment}', top {len(records)} by {sort_by}\n\n{table.to_string(index=False)}",
+            TOOL_TOKEN_BUDGET,
+        )
+    except Exception as e:
+        return f"Error listing customers: {str(e)}"
+
+@timed_tool
+async def list_customers(ctx: RunContext[Deps], segment: str = "all", limit: int = 20, sort_by: str = "clv") -> str:
+    """Customers of a segment with their segment, cluster, CLV, visits, recency and favourite item.
+
+    Args:
+        segment: 'all', an RFM segment ('Champions', 'Loyal', 'Potential', 'At Risk') or 'cluster N'.
+        limit: Maximum number of customers to return (at most 100).
+        sort_by: 'clv', 'frequency', 'aov' or 'recency' (most recent first).
+    """
+    return await run_blocking(customer_listing, ctx.deps.kpi_folder, segment, limit, sort_by)